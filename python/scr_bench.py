@@ -0,0 +1,64 @@
+"""Benchmark import time and per-call overhead of the scr module.
+
+Measures the time to import scr and the mean time of a need_checkpoint()
+and a route_file() call, either through the compiled _scr_cffi extension
+(cffi API mode) or by loading libscr.so at import time (cffi ABI mode).
+Run it once for each mode to compare them, e.g.:
+
+  mpirun -np 1 python scr_bench.py --mode api
+  mpirun -np 1 python scr_bench.py --mode abi
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import argparse
+
+# high resolution clock (python 3.3+)
+clock = getattr(time, 'perf_counter', time.time)
+
+parser = argparse.ArgumentParser(
+  description="Benchmark import time and per-call overhead of the scr module.",
+  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument('--mode', help='api to require the _scr_cffi extension, abi to load libscr.so with dlopen',
+                    choices=['api', 'abi'], default='api')
+parser.add_argument('--calls', help='number of calls to time for each function', type=int, default=100000)
+args = parser.parse_args()
+
+# initialize MPI before timing the import, if mpi4py is available
+try:
+  from mpi4py import MPI
+except ImportError:
+  pass
+
+# a None entry in sys.modules makes the import of _scr_cffi in scr.py fail
+if args.mode == 'abi':
+  sys.modules['_scr_cffi'] = None
+
+start = clock()
+import scr
+import_secs = clock() - start
+
+mode = 'api' if sys.modules.get('_scr_cffi') is not None else 'abi'
+if mode != args.mode:
+  print("ERROR: the _scr_cffi extension module is not available")
+  sys.exit(1)
+
+scr.init()
+
+start = clock()
+for i in range(args.calls):
+  scr.need_checkpoint()
+need_secs = (clock() - start) / args.calls
+
+names = ['ckpt.%d' % i for i in range(8)]
+start = clock()
+for i in range(args.calls):
+  scr.route_file(names[i & 7])
+route_secs = (clock() - start) / args.calls
+
+scr.finalize()
+
+print("mode=%s import=%.3f ms need_checkpoint=%.0f ns route_file=%.0f ns" %
+      (mode, import_secs * 1e3, need_secs * 1e9, route_secs * 1e9))
@@ -0,0 +1,84 @@
+"""Benchmark the collectives that scr.Poller saves in a timestep loop.
+
+Runs a loop of short timesteps three times: calling need_checkpoint()
+and should_exit() on every step, through a Poller with min_steps, and
+through a Poller with min_seconds.  For each loop, it reports the number
+of calls into libscr and of broadcasts per 1000 steps, and the elapsed time,
+e.g.:
+
+  mpirun -np 4 python scr_poller_bench.py --steps 10000 --step-secs 0.001
+"""
+
+from __future__ import print_function
+
+import time
+import argparse
+
+from mpi4py import MPI
+import scr
+
+parser = argparse.ArgumentParser(
+  description="Benchmark the collectives that scr.Poller saves in a timestep loop.",
+  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument('--steps', help='number of timesteps in each loop', type=int, default=1000)
+parser.add_argument('--step-secs', help='seconds of compute per timestep', type=float, default=0.001)
+parser.add_argument('--min-steps', help='min_steps of the Poller in the min_steps loop', type=int, default=10)
+parser.add_argument('--min-seconds', help='min_seconds of the Poller in the min_seconds loop', type=float, default=0.05)
+args = parser.parse_args()
+
+# number of calls of the module functions, which are collective in libscr
+calls = {'scr': 0, 'bcast': 0}
+
+def counted(func):
+  def wrapper(*a):
+    calls['scr'] += 1
+    return func(*a)
+  return wrapper
+
+# the Poller calls the module functions, so it counts through these too
+scr.need_checkpoint = counted(scr.need_checkpoint)
+scr.should_exit = counted(scr.should_exit)
+
+# a communicator that counts broadcasts
+class CountingComm(object):
+  def __init__(self, comm):
+    self.comm = comm
+    self.rank = comm.rank
+
+  def bcast(self, obj, root=0):
+    calls['bcast'] += 1
+    return self.comm.bcast(obj, root=root)
+
+# run a loop of timesteps, polling with the given Poller, or every step if None
+def run(poller):
+  calls['scr'] = 0
+  calls['bcast'] = 0
+  MPI.COMM_WORLD.barrier()
+  start = time.time()
+  for i in range(args.steps):
+    time.sleep(args.step_secs)
+    if poller is None:
+      scr.need_checkpoint()
+      scr.should_exit()
+    else:
+      poller.step()
+      poller.need_checkpoint()
+      poller.should_exit()
+  MPI.COMM_WORLD.barrier()
+  return calls['scr'], calls['bcast'], time.time() - start
+
+scr.init()
+
+comm = CountingComm(MPI.COMM_WORLD)
+loops = [
+  ('every', None),
+  ('min_steps=%d' % args.min_steps, scr.Poller(min_steps=args.min_steps)),
+  ('min_seconds=%g' % args.min_seconds, scr.Poller(min_seconds=args.min_seconds, comm=comm)),
+]
+for name, poller in loops:
+  ncalls, nbcasts, secs = run(poller)
+  if comm.rank == 0:
+    print("%-18s collectives/1000 steps: %6.1f scr %6.1f bcast, %.3f s" %
+          (name, ncalls * 1000.0 / args.steps, nbcasts * 1000.0 / args.steps, secs))
+
+scr.finalize()
@@ -24,3 +24,6 @@ srun -n 2 python scr_test.py 4
 
 # check that scr.init throws an exception if SCR_Init returns an error
 srun -n 2 python scr_test.py 5
+
+# test the array, pickle, polling, interval, and trace helpers, which do not need MPI
+python scr_unit_test.py
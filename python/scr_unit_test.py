@@ -0,0 +1,390 @@
+"""Run tests of the python interface that do not need MPI.
+
+The libscr functions that the helpers call are replaced with fakes
+that route files to a temporary directory, so that the array and pickle
+helpers, the Poller, the interval model, and the trace hook can be
+tested in a single process without a running SCR job.
+
+  python scr_unit_test.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+import scr
+
+# scr_ckpt_interval.py, from which _optimum_interval is repeated
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'common'))
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+try:
+  pickle = scr._pickle5()
+except ImportError:
+  pickle = None
+
+# stands in for the libscr functions of the scr module,
+# routing each dataset to its own directory under tmpdir,
+# and restarting from the most recent valid dataset first
+class FakeSCR(object):
+  funcs = ('route_file', 'route_files', 'start_output', 'complete_output',
+           'have_restart', 'start_restart', 'complete_restart', 'need_checkpoint', 'should_exit')
+
+  def __init__(self, tmpdir):
+    self.tmpdir = tmpdir
+    self.datasets = []
+    self.name = None
+    self.need = []
+    self.exit = []
+    self.calls = {'need_checkpoint': 0, 'should_exit': 0}
+    self.saved = dict((f, getattr(scr, f)) for f in self.funcs)
+    for f in self.funcs:
+      setattr(scr, f, getattr(self, f))
+
+  def restore(self):
+    for f, func in self.saved.items():
+      setattr(scr, f, func)
+
+  def route_file(self, fname, binary=False):
+    path = os.path.join(self.tmpdir, self.name, fname)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    return path
+
+  def route_files(self, fnames, binary=False):
+    return [self.route_file(fname) for fname in fnames]
+
+  def start_output(self, name, flags):
+    self.name = name
+
+  def complete_output(self, valid):
+    if valid:
+      self.datasets.append(self.name)
+    self.name = None
+    return bool(valid)
+
+  def have_restart(self):
+    return self.datasets[-1] if self.datasets else None
+
+  def start_restart(self):
+    self.name = self.datasets.pop()
+    return self.name
+
+  def complete_restart(self, valid):
+    self.name = None
+    return bool(valid)
+
+  # need_checkpoint() and should_exit() return the next queued value, or False
+  def need_checkpoint(self):
+    self.calls['need_checkpoint'] += 1
+    return self.need.pop(0) if self.need else False
+
+  def should_exit(self):
+    self.calls['should_exit'] += 1
+    return self.exit.pop(0) if self.exit else False
+
+# a communicator that counts broadcasts, and returns root_value from
+# bcast() on ranks other than 0 in place of the value of rank 0
+class FakeComm(object):
+  def __init__(self, rank=0, root_value=None):
+    self.rank = rank
+    self.root_value = root_value
+    self.bcasts = 0
+
+  def bcast(self, obj, root=0):
+    self.bcasts += 1
+    return obj if self.rank == root else self.root_value
+
+# a clock for scr.time that advances by a fixed number of seconds per tick()
+class FakeClock(object):
+  def __init__(self, now=1000.0):
+    self.now = now
+
+  def time(self):
+    return self.now
+
+  def tick(self, secs):
+    self.now += secs
+
+class FakeTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.fake = FakeSCR(self.tmpdir)
+
+  def tearDown(self):
+    self.fake.restore()
+    shutil.rmtree(self.tmpdir)
+
+@unittest.skipIf(np is None, "requires numpy")
+class ArraysTest(FakeTest):
+  def arrays(self):
+    a = np.arange(24, dtype='f8').reshape(4, 6)
+    return {
+      'c': a,
+      'f': np.asfortranarray(a.astype('i2')),
+      'strided': a[:, ::2],
+      'empty': np.zeros((0, 3)),
+      'scalar': np.array(3.5),
+      'record': np.array([(1, 2.0)], dtype=[('x', 'i4'), ('y', 'f8')]),
+    }
+
+  def check(self, arrays, loaded):
+    self.assertEqual(sorted(loaded), sorted(arrays))
+    for key, arr in arrays.items():
+      self.assertEqual(loaded[key].dtype, arr.dtype, key)
+      self.assertEqual(loaded[key].shape, arr.shape, key)
+      self.assertTrue((loaded[key] == arr).all(), key)
+
+  def test_npy_header(self):
+    # files are in .npy format, which numpy.load() reads back
+    arrays = self.arrays()
+    self.assertTrue(scr.save_arrays('ckpt.1', arrays, prefix='rank_0/'))
+    for key, arr in arrays.items():
+      path = os.path.join(self.tmpdir, 'ckpt.1', 'rank_0', key + '.npy')
+      with open(path, 'rb') as f:
+        self.assertEqual(np.lib.format.read_magic(f), (2, 0))
+      self.assertTrue((np.load(path) == arr).all(), key)
+    self.assertTrue(np.load(os.path.join(self.tmpdir, 'ckpt.1', 'rank_0', 'f.npy')).flags.f_contiguous)
+
+  def test_round_trip(self):
+    arrays = self.arrays()
+    self.assertTrue(scr.save_arrays('ckpt.1', arrays))
+    name, loaded = scr.load_arrays()
+    self.assertEqual(name, 'ckpt.1')
+    self.check(arrays, loaded)
+    self.assertTrue(loaded['f'].flags.f_contiguous)
+
+  def test_memmap(self):
+    arrays = self.arrays()
+    self.assertTrue(scr.save_arrays('ckpt.1', arrays))
+    name, loaded = scr.load_arrays(mmap_mode='r')
+    self.assertEqual(name, 'ckpt.1')
+    self.check(arrays, loaded)
+    self.assertIsInstance(loaded['c'], np.memmap)
+    self.assertTrue(loaded['f'].flags.f_contiguous)
+
+  def test_chunked(self):
+    # an array that is not contiguous is written one chunk at a time
+    a = np.arange(1000, dtype='i4').reshape(10, 100)[::3, 1::7]
+    chunk = scr._arrays_chunk
+    scr._arrays_chunk = 16
+    try:
+      self.assertTrue(scr.save_arrays('ckpt.1', {'a': a}))
+    finally:
+      scr._arrays_chunk = chunk
+    self.check({'a': a}, scr.load_arrays()[1])
+
+  def test_objects(self):
+    # arrays of python objects are refused, after the phase is closed
+    self.assertRaises(ValueError, scr.save_arrays, 'ckpt.1', {'o': np.array([None])})
+    self.assertIsNone(self.fake.name)
+    self.assertEqual(self.fake.datasets, [])
+
+  def test_fallback(self):
+    # a dataset with a missing file is skipped for the one before it
+    self.assertTrue(scr.save_arrays('ckpt.1', {'a': np.arange(3)}))
+    self.assertTrue(scr.save_arrays('ckpt.2', {'a': np.arange(4)}))
+    os.remove(os.path.join(self.tmpdir, 'ckpt.2', 'a.npy'))
+    name, loaded = scr.load_arrays()
+    self.assertEqual(name, 'ckpt.1')
+    self.check({'a': np.arange(3)}, loaded)
+    self.assertEqual(scr.load_arrays(), (None, {}))
+
+@unittest.skipIf(pickle is None, "requires pickle protocol 5")
+class ObjectsTest(FakeTest):
+  def test_out_of_band(self):
+    # buffers are written to their own files rather than into the pickle
+    data = bytearray(b'x' * 4096)
+    obj = {'data': pickle.PickleBuffer(data), 'nested': [1, 'two', {'three': 3.0}]}
+    self.assertTrue(scr.save_objects('ckpt.1', obj, prefix='rank_0/'))
+
+    outdir = os.path.join(self.tmpdir, 'ckpt.1', 'rank_0')
+    self.assertEqual(sorted(os.listdir(outdir)), ['buffer_0.bin', 'scr_objects.pkl'])
+    with open(os.path.join(outdir, 'buffer_0.bin'), 'rb') as f:
+      self.assertEqual(f.read(), data)
+    with open(os.path.join(outdir, 'scr_objects.pkl'), 'rb') as f:
+      meta = pickle.load(f)
+    self.assertEqual(meta['buffers'], ['rank_0/buffer_0.bin'])
+    self.assertLess(len(meta['pickle']), len(data))
+
+    for mmap in (False, True):
+      self.fake.datasets = ['ckpt.1']
+      name, loaded = scr.load_objects(prefix='rank_0/', mmap=mmap)
+      self.assertEqual(name, 'ckpt.1')
+      self.assertEqual(bytes(loaded['data']), bytes(data))
+      self.assertEqual(loaded['nested'], obj['nested'])
+
+  @unittest.skipIf(np is None, "requires numpy")
+  def test_arrays(self):
+    obj = {'a': np.arange(10.0), 'f': np.ones((3, 4), dtype='i4', order='F'), 'strided': np.arange(20)[::2]}
+    self.assertTrue(scr.save_objects('ckpt.1', obj))
+    # the strided array is pickled in band
+    self.assertEqual(len([f for f in os.listdir(os.path.join(self.tmpdir, 'ckpt.1')) if f.startswith('buffer_')]), 2)
+
+    for mmap in (False, True):
+      self.fake.datasets = ['ckpt.1']
+      name, loaded = scr.load_objects(mmap=mmap)
+      self.assertEqual(name, 'ckpt.1')
+      for key, arr in obj.items():
+        self.assertEqual(loaded[key].dtype, arr.dtype, key)
+        self.assertTrue((loaded[key] == arr).all(), key)
+      self.assertTrue(loaded['f'].flags.f_contiguous)
+
+      # each load gets a private, writable copy of the data
+      loaded['a'][0] = 7.0
+      self.assertTrue(loaded['a'].flags.writeable)
+    with open(os.path.join(self.tmpdir, 'ckpt.1', 'buffer_0.bin'), 'rb') as f:
+      self.assertEqual(f.read(), obj['a'].tobytes())
+
+  def test_unpicklable(self):
+    # an object that cannot be pickled fails the phase and is raised
+    self.assertRaises(Exception, scr.save_objects, 'ckpt.1', {'f': lambda x: x})
+    self.assertEqual(self.fake.datasets, [])
+    self.assertEqual(scr.load_objects(), (None, None))
+
+class PollerTest(FakeTest):
+  def setUp(self):
+    FakeTest.setUp(self)
+    self.clock = FakeClock()
+    self.time = scr.time
+    scr.time = self.clock
+
+  def tearDown(self):
+    scr.time = self.time
+    FakeTest.tearDown(self)
+
+  def test_min_steps(self):
+    # SCR is polled every min_steps steps, and not at all in between
+    poller = scr.Poller(min_steps=3)
+    polled = []
+    for s in range(1, 13):
+      if poller.step():
+        polled.append(s)
+      else:
+        self.assertFalse(poller.need_checkpoint())
+      self.assertFalse(poller.should_exit())
+    self.assertEqual(polled, [3, 6, 9, 12])
+    self.assertEqual(poller.polls, 4)
+    self.assertEqual(self.fake.calls, {'need_checkpoint': 0, 'should_exit': 4})
+
+  def test_once_per_step(self):
+    # each of need_checkpoint() and should_exit() polls SCR at most once per step
+    self.fake.need = [True]
+    poller = scr.Poller()
+    poller.step()
+    self.assertTrue(poller.need_checkpoint())
+    self.assertTrue(poller.need_checkpoint())
+    self.assertFalse(poller.should_exit())
+    self.assertFalse(poller.should_exit())
+    self.assertEqual(self.fake.calls, {'need_checkpoint': 1, 'should_exit': 1})
+
+  def test_should_exit(self):
+    # once SCR says to exit, should_exit() stays True without polling again
+    self.fake.exit = [False, True]
+    poller = scr.Poller(min_steps=2)
+    answers = []
+    for s in range(8):
+      poller.step()
+      answers.append(poller.should_exit())
+    self.assertEqual(answers, [False, False, False, True, True, True, True, True])
+    self.assertEqual(self.fake.calls['should_exit'], 2)
+
+  def test_min_seconds(self):
+    # steps of 1/8 second stretch the stride to 8 steps for polls 1 second apart,
+    # and each poll costs one broadcast
+    comm = FakeComm()
+    poller = scr.Poller(min_steps=2, min_seconds=1.0, comm=comm)
+    polled = []
+    for s in range(1, 41):
+      self.clock.tick(0.125)
+      if poller.step():
+        polled.append(s)
+    self.assertEqual(polled, [2, 10, 18, 26, 34])
+    self.assertEqual(poller.stride, 8)
+    self.assertEqual(comm.bcasts, len(polled))
+
+    # slower steps shrink the stride, but not below min_steps
+    self.clock.tick(10.0)
+    for s in range(8):
+      poller.step()
+    self.assertEqual(poller.stride, 2)
+
+  def test_root_stride(self):
+    # ranks other than 0 take the stride that rank 0 broadcasts
+    comm = FakeComm(rank=1, root_value=5)
+    poller = scr.Poller(min_seconds=1.0, comm=comm)
+    polled = [s for s in range(1, 12) if poller.step()]
+    self.assertEqual(polled, [1, 6, 11])
+
+  def test_requires_comm(self):
+    self.assertRaises(ValueError, scr.Poller, min_seconds=1.0)
+
+class IntervalTest(unittest.TestCase):
+  def test_young(self):
+    self.assertAlmostEqual(scr._optimum_interval(50.0, 10000.0, 'young'), 1000.0)
+
+  def test_daly(self):
+    # a checkpoint that costs at least twice the MTTI is taken every MTTI
+    self.assertEqual(scr._optimum_interval(300.0, 100.0, 'daly'), 100.0)
+    self.assertLess(scr._optimum_interval(50.0, 10000.0, 'daly'), scr._optimum_interval(50.0, 10000.0, 'young'))
+
+  def test_matches_scr_ckpt_interval(self):
+    import scr_ckpt_interval
+    for cost, mtti in ((1.0, 3600.0), (50.0, 10000.0), (120.0, 100.0), (300.0, 100.0)):
+      for model in ('daly', 'young'):
+        c = {'checkpoint_cost': cost, 'mtti': mtti}
+        expected = scr_ckpt_interval.optimum_interval(c, model)[0]
+        self.assertAlmostEqual(scr._optimum_interval(cost, mtti, model), expected)
+
+class TraceTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'trace.3.jsonl')
+    self.prev = scr.set_trace_hook(scr._jsonl_hook(self.path, 3))
+
+  def tearDown(self):
+    scr.set_trace_hook(self.prev)
+    shutil.rmtree(self.tmpdir)
+
+  def records(self):
+    with open(self.path) as f:
+      return [json.loads(line) for line in f]
+
+  def test_record(self):
+    # each call appends one line of JSON with the call, its arguments,
+    # return code, times, and rank
+    rc = scr._traced('SCR_Start_output', ['ckpt.1', scr.FLAG_CHECKPOINT], lambda name, flags: 0, b'ckpt.1', 1)
+    self.assertEqual(rc, 0)
+    scr._traced('SCR_Route_file', [b'ckpt.1/rank_0.dat'], lambda name, buf: 0, b'ckpt.1/rank_0.dat', None)
+    scr._traced('SCR_Config', ['SCR_DEBUG'], lambda conf: 'ptr', b'SCR_DEBUG')
+
+    records = self.records()
+    self.assertEqual(len(records), 3)
+    for r in records:
+      self.assertEqual(sorted(r), ['args', 'call', 'end', 'rank', 'rc', 'start'])
+      self.assertEqual(r['rank'], 3)
+      self.assertLessEqual(r['start'], r['end'])
+    self.assertEqual(records[0]['call'], 'SCR_Start_output')
+    self.assertEqual(records[0]['args'], ['ckpt.1', scr.FLAG_CHECKPOINT])
+    self.assertEqual(records[0]['rc'], 0)
+
+    # bytes arguments are decoded, and return values that are not codes are dropped
+    self.assertEqual(records[1]['args'], ['ckpt.1/rank_0.dat'])
+    self.assertIsNone(records[2]['rc'])
+
+  def test_append(self):
+    # a second hook on the same path appends rather than truncates
+    scr._traced('SCR_Init', [], lambda: 0)
+    scr.set_trace_hook(scr._jsonl_hook(self.path, 3))
+    scr._traced('SCR_Finalize', [], lambda: 0)
+    self.assertEqual([r['call'] for r in self.records()], ['SCR_Init', 'SCR_Finalize'])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,4 +1,38 @@
-from distutils.core import setup
+# Build the _scr_cffi extension module (cffi API mode) when setuptools
+# and cffi are available, otherwise install just the python files,
+# and scr.py will load libscr.so at import time (cffi ABI mode).
+# The extension is optional, if it cannot be compiled, e.g., without a
+# C compiler or without scr.h, the install goes on without it.
+try:
+  from setuptools import setup
+  from setuptools.command.build_ext import build_ext
+  import cffi
+except ImportError:
+  from distutils.core import setup
+  cffi_args = {}
+else:
+  from distutils.errors import CCompilerError, DistutilsExecError, DistutilsPlatformError
+
+  # build_ext that warns rather than fails when an extension does not build
+  class optional_build_ext(build_ext):
+    def run(self):
+      try:
+        build_ext.run(self)
+      except DistutilsPlatformError as e:
+        self.warn_abi(e)
+
+    def build_extension(self, ext):
+      try:
+        build_ext.build_extension(self, ext)
+      except (CCompilerError, DistutilsExecError, DistutilsPlatformError, IOError, OSError) as e:
+        self.warn_abi(e)
+
+    def warn_abi(self, e):
+      self.warn('failed to build the _scr_cffi extension module: %s' % e)
+      self.warn('scr.py will load libscr.so at import time (cffi ABI mode)')
+
+  cffi_args = dict(setup_requires=['cffi'], cffi_modules=['scr_build.py:ffibuilder'],
+                   cmdclass={'build_ext': optional_build_ext})
 
 # https://packaging.python.org/guides/distributing-packages-using-setuptools/#setup-py
 
@@ -18,7 +52,7 @@ setup(
 #  long_description_content_type='text/markdown',
   keywords='scalable, checkpoint, restart, mpi, scr',
 
-  py_modules=['scr'],
+  py_modules=['scr', 'scr_build', 'scr_ckpt_state'],
 #  install_requires=['cffi'],
   platforms=['posix'],
 
@@ -35,4 +69,6 @@ setup(
     'Programming Language :: Python :: 2',
     'Programming Language :: Python :: 3',
   ],
+
+  **cffi_args
 )
@@ -6,13 +6,59 @@ based on checkpoint cost and mean time to interrupt using traditional models.
 
 The intent is for someone to include this in a job script like so:
   export SCR_CHECKPOINT_SECONDS=`python scr_ckpt_interval.py`
+
+Since the log file only grows, the running totals and the byte offset
+that has been parsed so far are saved to a state file next to the log.
+A later invocation only parses the lines appended since then.
+
+The young and daly models treat a checkpoint and its flush to the
+parallel file system as a single cost.  The multilevel model separates
+the cost of writing a checkpoint to cache from the cost of flushing it,
+and it separates failures that SCR recovers from cache from those that
+require a fetch from the file system.  It reports both the checkpoint
+interval and how many checkpoints to write between flushes, e.g.,:
+  export SCR_CHECKPOINT_SECONDS=`python scr_ckpt_interval.py --model multilevel`
+  export SCR_FLUSH=`python scr_ckpt_interval.py --model multilevel --flush`
+The first start of each job is not counted as a failure.  Until a job
+has needed a fetch from the file system, the multilevel model does not
+recommend more checkpoints per flush than the current SCR_FLUSH, or 10
+if that is not set.
+
+With SCR_FLUSH_ASYNC, a flush runs in the background while the application
+computes.  Only the part of an asynchronous flush that did not overlap a
+compute phase is charged to the checkpoint cost.  --stats reports how much
+flush time was hidden behind compute and how much was exposed.
+
+To analyze many jobs at once, pass several log files with --logs
+(glob patterns are expanded) or a file listing them with --loglist.
+The logs are parsed in a pool of --procs processes, and the script prints
+statistics for each log, for each job name, and across all logs, e.g.,:
+  python scr_ckpt_interval.py --logs '/p/lustre/*/run*/.scr/log' --jobname '/p/lustre/([^/]+)/'
+Nothing is written next to the logs, which may belong to other users.
+Each log is parsed from the start unless --statefile names a directory
+to save the totals of each log in for the next invocation, e.g.,:
+  python scr_ckpt_interval.py --loglist logs.txt --statefile ~/.cache/scr_ckpt_interval
+
+With SCR_LOG_SYSLOG_ENABLE, the records of every job on a machine also reach
+syslog.  --syslog reads them from aggregated syslog files, plain or gzip,
+and adds up the runs of each prefix directory as its log would, e.g.,:
+  python scr_ckpt_interval.py --syslog /var/log/messages /var/log/messages.*.gz --procs 16
 """
 
+from __future__ import print_function
+
 import sys
 import os
+import re
 import math
+import json
+import time
+import glob
+import hashlib
+import multiprocessing
 import scrlog
 import argparse
+from scr_ckpt_state import STATE_VERSION, new_totals, read_state, compute_costs
 
 # TODO: Return a reasonable default value when no log file exists.
 
@@ -21,220 +67,570 @@ import argparse
 # for true failure cases. Perhaps count up number of starts minus number
 # of SCR_FINALIZE_CALLED?
 
-parser = argparse.ArgumentParser(
-  description="Given an SCR log file, estimate optimum checkpoint interval based on checkpoint cost and mean time to interrupt.",
-  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument('--stats', help='print stats for checkpoint cost and failure rate', action='store_true')
-parser.add_argument('--model', help='model to compute optimum checkpoint interval', type=str, choices=['young','daly'], default='daly')
-parser.add_argument('--percent', help='express optimum checkpoint interval as percent overhead', action='store_true')
-parser.add_argument('--prefix', help='prefix directory to look for log file', type=str)
-parser.add_argument('--logfile', help='path to log file', type=str)
-args = parser.parse_args(sys.argv[1:])
-
-# count up number of times job has started
-num_starts = 0.0
-
-# total time spent during fetch and number of times fetch was executed
-# this will count towards restart cost
-fetch_secs  = 0.0
-fetch_count = 0.0
-
-# total time spent during rebuild and number of times rebuild was executed
-# this will count towards restart cost
-rebuild_secs  = 0.0
-rebuild_count = 0.0
-
-# total time spent during compute phases number of compute phases
-# counts toward compute time
-compute_secs  = 0.0
-compute_count = 0.0
-
-# total time spent during checkpoint phases number of checkpoint phases
-# we'll include this in the checkpoint cost
-checkpoint_secs  = 0.0
-checkpoint_count = 0.0
-
-# total time spent flushing checkpoints and number of flushed checkpoints
-# we'll include this in the checkpoint cost
-flush_ckpt_secs  = 0.0
-flush_ckpt_count = 0.0
-
-# total time spent flushing output and number of flushed outputs (non-checkpoints)
-# this will be part of the "compute" time
-flush_output_secs  = 0.0
-flush_output_count = 0.0
-
-# tracks whether we are in a compute or checkpoint phase
-state = None
-
-# parse log file and get list of entries
-filename = os.path.join('.scr', 'log')
-if args.prefix:
-  filename = os.path.join(args.prefix, filename)
-if args.logfile:
-  filename = args.logfile
-try:
-  entries = scrlog.parse_file(filename)
-except:
-  if args.stats:
-    print "ERROR: failed to parse log file:", filename
-    print "Run this command from within the prefix directory of the job,"
-    print "specify the prefix directory with --prefix, or provide the path to the log file with --logfile"
+# labels of the log entries that we account for below,
+# all other entries are skipped without being fully parsed
+labels = frozenset([
+  'START', 'FETCH', 'RESTART_SUCCESS', 'RESTART_FAIL', 'RESTART_FAILURE',
+  'COMPUTE_START', 'COMPUTE_END', 'CHECKPOINT_START', 'CHECKPOINT_END',
+  'WRITE', 'ENCODE', 'FLUSH_SYNC',
+  'ASYNC_FLUSH_START', 'ASYNC_FLUSH_SUCCESS', 'ASYNC_FLUSH_FAIL',
+])
+
+# most compute and checkpoint phases remembered while asynchronous flushes run,
+# SCR runs one flush at a time, so this only matters for logs that are missing
+# the end of a flush
+max_async_phases = 1000
+
+# convert the datetime of a log entry to seconds since the epoch
+def entry_seconds(e):
+  return time.mktime(e['timestamp'].timetuple())
+
+# called at the end of a compute or checkpoint phase that lasted secs,
+# remember the phase if an asynchronous flush may have overlapped it
+def end_phase(t, secs):
+  if t['phase_start'] is not None and t['async_active']:
+    t['async_phases'].append([t['state'], t['phase_start'], t['phase_start'] + secs])
+    if len(t['async_phases']) > max_async_phases:
+      del t['async_phases'][:-max_async_phases]
+  t['phase_start'] = None
+
+# return number of seconds that [start1, end1] and [start2, end2] overlap
+def overlap(start1, end1, start2, end2):
+  return max(0.0, min(end1, end2) - max(start1, start2))
+
+# called when an asynchronous flush of dset completes after secs,
+# split its time into the part hidden behind compute phases,
+# the part that overlapped checkpoint phases, and the rest
+def end_async_flush(t, e):
+  secs = e['secs']
+  dset = str(e.get('dset'))
+  start = t['async_active'].pop(dset, entry_seconds(e) - secs)
+  end = start + secs
+
+  overlaps = {'compute': 0.0, 'checkpoint': 0.0}
+  for state, phase_start, phase_end in t['async_phases']:
+    if state in overlaps:
+      overlaps[state] += overlap(start, end, phase_start, phase_end)
+
+  # include the phase we are in now, if any, up to the end of the flush
+  if t['phase_start'] is not None and t['state'] in overlaps:
+    overlaps[t['state']] += overlap(start, end, t['phase_start'], end)
+
+  # timestamps only have one second resolution, so clamp to the flush time
+  hidden = min(overlaps['compute'], secs)
+  in_ckpt = min(overlaps['checkpoint'], secs - hidden)
+
+  t['async_flush_secs']   += secs
+  t['async_flush_count']  += 1.0
+  t['async_hidden_secs']  += hidden
+  t['async_in_ckpt_secs'] += in_ckpt
+
+  # a flush that started before this one and is still running lost its end
+  # record, e.g., when a job was killed mid-flush, so we stop waiting for it
+  for key, active_start in list(t['async_active'].items()):
+    if active_start < start:
+      del t['async_active'][key]
+
+  # forget phases that ended before the oldest flush still running
+  if t['async_active']:
+    oldest = min(t['async_active'].values())
+    t['async_phases'] = [p for p in t['async_phases'] if p[2] > oldest]
   else:
-    # TODO: check for .scr, if we find that assume this is the first run, if not, report an error
-    # for the first run, let's go wtih 10% overhead until we accumulate some data
-    print "10.0"
-  quit()
+    t['async_phases'] = list()
 
 # run over entries and add up time and number of times we executed different phases
-for e in entries:
-  dt = e['timestamp']
-
-  # count number of times we see event=START signaling start of new run
+def accumulate(t, e):
+  # count number of times we see event=START signaling start of new run,
+  # a new run is not in any phase, and it cannot still be flushing
+  # a dataset from the previous run
   if e['label'] == 'START':
-    num_starts += 1.0
-    continue
+    t['state'] = None
+    t['phase_start'] = None
+    t['async_active'] = dict()
+    t['async_phases'] = list()
+    if t['num_starts'] == 0.0:
+      t['num_jobs'] += 1.0
+    t['num_starts'] += 1.0
+    return
 
   # fetch time and count
   if e['label'] == 'FETCH':
-    secs = e['secs']
-    fetch_secs += secs
-    fetch_count += 1.0
-    continue
+    t['fetch_secs'] += e['secs']
+    t['fetch_count'] += 1.0
+    return
 
   # rebuild time and count
   if e['label'] == 'RESTART_SUCCESS':
-    secs = e['secs']
-    rebuild_secs += secs
-    rebuild_count += 1.0
-    continue
+    t['rebuild_secs'] += e['secs']
+    t['rebuild_count'] += 1.0
+    return
 
-  # rebuild time and count
-  if e['label'] == 'RESTART_FAILURE':
-    secs = e['secs']
-    rebuild_secs += secs
-    rebuild_count += 1.0
-    continue
+  # rebuild time and count,
+  # scr_cache_rebuild logs RESTART_FAIL, older logs may use RESTART_FAILURE
+  if e['label'] == 'RESTART_FAIL' or e['label'] == 'RESTART_FAILURE':
+    t['rebuild_secs'] += e['secs']
+    t['rebuild_count'] += 1.0
+    return
 
   # start of compute phase
   if e['label'] == 'COMPUTE_START':
-    state = 'compute'
-    continue
+    t['state'] = 'compute'
+    t['phase_start'] = entry_seconds(e)
+    return
 
   # end of compute phase
   if e['label'] == 'COMPUTE_END':
-    secs = e['secs']
-    compute_secs += secs
-    compute_count += 1.0
-    continue
+    t['compute_secs'] += e['secs']
+    t['compute_count'] += 1.0
+    end_phase(t, e['secs'])
+    return
 
   # start of checkpoint phase
   if e['label'] == 'CHECKPOINT_START':
-    state = 'checkpoint'
-    continue
+    t['state'] = 'checkpoint'
+    t['phase_start'] = entry_seconds(e)
+    return
 
   # end of checkpoint phase
   if e['label'] == 'CHECKPOINT_END':
-    secs = e['secs']
-    checkpoint_secs += secs
-    checkpoint_count += 1.0
-    continue
+    t['checkpoint_secs'] += e['secs']
+    t['checkpoint_count'] += 1.0
+    end_phase(t, e['secs'])
+    return
+
+  # time writing checkpoint files to cache
+  if e['label'] == 'WRITE':
+    t['write_secs'] += e['secs']
+    t['write_count'] += 1.0
+    return
+
+  # time applying redundancy encoding in cache
+  if e['label'] == 'ENCODE':
+    t['encode_secs'] += e['secs']
+    t['encode_count'] += 1.0
+    return
 
   # flush time and count
   # if in checkpoint, add to checkpoint time, if in output add to compute time
   if e['label'] == 'FLUSH_SYNC':
-    secs = e['secs']
-    if state == 'checkpoint':
-      flush_ckpt_secs += secs
-      flush_ckpt_count += 1.0
+    if t['state'] == 'checkpoint':
+      t['flush_ckpt_secs'] += e['secs']
+      t['flush_ckpt_count'] += 1.0
     else:
-      flush_output_secs += secs
-      flush_output_count += 1.0
-    continue
-
-#  print e
-
-fetch_cost = fetch_secs
-if fetch_count > 0.0:
-  fetch_cost /= fetch_count
-
-rebuild_cost = rebuild_secs
-if rebuild_count > 0.0:
-  rebuild_cost /= rebuild_count
-
-compute_cost = compute_secs
-if compute_count > 0.0:
-  compute_cost /= compute_count
-
-# We're not accounting for multi-level checkpointing right now.
-# For an approximate single-level cost, sum time spent in checkpoints (write + encode)
-# and all time flushing checkpoints (but not pure output) and divide by number of tmies we've checkpointed.
-checkpoint_cost = checkpoint_secs + flush_ckpt_secs
-if checkpoint_count > 0.0:
-  checkpoint_cost /= checkpoint_count
-
-flush_ckpt_cost = flush_ckpt_secs
-if flush_ckpt_count > 0.0:
-  flush_ckpt_cost /= flush_ckpt_count
-
-flush_output_cost = flush_output_secs
-if flush_output_count > 0.0:
-  flush_output_cost /= flush_output_count
-
-if args.stats:
-  print "Fetch time total/avg (s): ", fetch_secs, fetch_cost
-  print "Rebuild time total/avg (s): ", rebuild_secs, rebuild_cost
-  print "Compute time total/avg (s): ", compute_secs, compute_cost
-  print "Checkpoint time total/avg (s): ", checkpoint_secs, checkpoint_cost
-  print "Flush checkpoint time total/avg (s): ", flush_ckpt_secs, flush_ckpt_cost
-  print "Flush output time total/avg (s): ", flush_output_secs, flush_output_cost
-
-# for average time before failure, we use total runtime
-# divided by the number of job starts
-total_secs = fetch_secs + rebuild_secs + compute_secs + checkpoint_secs + flush_ckpt_secs + flush_output_secs
-avg_secs_before_failure = total_secs
-if num_starts > 0.0:
-  avg_secs_before_failure /= num_starts
-if args.stats:
-  print "Starts: ", num_starts
-  print "Total time (s): " + str(total_secs)
-  print "Mean time to interrupt (s): " + str(avg_secs_before_failure)
-
-if args.model == 'young':
-  # "A First Order Approximation to the Optimum Checkpoint Interval",
-  # John Young, 1976.
-  opt_checkpoint_secs = math.sqrt(2.0 * checkpoint_cost * avg_secs_before_failure)
-  opt_checkpoint_overhead = checkpoint_cost * 100.0 / opt_checkpoint_secs
-  if args.stats:
-    print "Model = Young"
-    print "Checkpoint Interval (s) = " + str(opt_checkpoint_secs)
-    print "Percent Overhead = " + str(opt_checkpoint_overhead)
-  else:
-    if args.percent:
-      # print overhead percentage as float
-      print str(opt_checkpoint_overhead)
+      t['flush_output_secs'] += e['secs']
+      t['flush_output_count'] += 1.0
+    return
+
+  # start of an asynchronous flush
+  if e['label'] == 'ASYNC_FLUSH_START':
+    t['async_active'][str(e.get('dset'))] = entry_seconds(e)
+    return
+
+  # end of an asynchronous flush, the FLUSH_ASYNC transfer record
+  # that follows repeats the same time, so we skip that one
+  if e['label'] == 'ASYNC_FLUSH_SUCCESS' or e['label'] == 'ASYNC_FLUSH_FAIL':
+    end_async_flush(t, e)
+    return
+
+# Two-level extension of Young's first order model, following the
+# levels of "Design, Modeling, and Evaluation of a Scalable Multi-level
+# Checkpointing System", Moody, Bronevetsky, Mohror, de Supinski, SC 2010.
+# The log only distinguishes failures recovered from cache (level 1)
+# from failures that need a fetch from the file system (level 2),
+# so we model those two levels.
+#
+# A checkpoint is written to cache every T seconds of compute at cost c1,
+# and every k-th checkpoint is also flushed at cost c2.  A level 1 failure
+# loses T/2 seconds of work on average and costs r1 to recover,
+# while a level 2 failure loses k*T/2 seconds and costs r2 to recover.
+# The fraction of time lost for failure rates l1 and l2 is:
+#
+#   W(T, k) = (c1 + c2/k)/T + l1*(T/2 + r1) + l2*(k*T/2 + r2)
+#
+# For a fixed k, this is minimized at T = sqrt(2*(c1 + c2/k) / (l1 + k*l2)),
+# so we evaluate W at that T for each k up to max_k and keep the best.
+# Returns (T, k, W) or None if there are no failures to model.
+def multilevel_interval(c1, c2, r1, r2, l1, l2, max_k=1000):
+  best = None
+  for k in range(1, max_k + 1):
+    cost = c1 + c2 / k
+    rate = l1 + k * l2
+    if rate <= 0.0:
+      return None
+    T = math.sqrt(2.0 * cost / rate)
+    if T <= 0.0:
+      continue
+    W = cost / T + l1 * (T / 2.0 + r1) + l2 * (k * T / 2.0 + r2)
+    if best is None or W < best[2]:
+      best = (T, k, W)
+  return best
+
+# read totals saved by a previous invocation, returns (totals, offset),
+# starts over from offset 0 if there is no saved state or if it does not
+# describe the current log file, e.g., if the log was replaced or truncated
+def load_state(statefile, st):
+  saved = read_state(statefile)
+  try:
+    if (saved is not None and
+        saved['inode'] == st.st_ino and
+        saved['size'] <= st.st_size and
+        saved['offset'] <= st.st_size):
+      return saved['totals'], saved['offset']
+  except (KeyError, TypeError):
+    pass
+  return new_totals(), 0
+
+# save totals and offset for the next invocation,
+# this is only an optimization, so ignore errors like a read-only directory
+def save_state(statefile, st, totals, offset):
+  saved = {
+    'version' : STATE_VERSION,
+    'inode'   : st.st_ino,
+    'size'    : st.st_size,
+    'offset'  : offset,
+    'totals'  : totals,
+  }
+  tmpfile = statefile + '.tmp'
+  try:
+    with open(tmpfile, 'w') as f:
+      json.dump(saved, f)
+    os.rename(tmpfile, statefile)
+  except (IOError, OSError):
+    pass
+
+# fields of the totals that describe where we are in the log rather than
+# amounts that can be summed across logs
+position_fields = frozenset(['state', 'phase_start', 'async_active', 'async_phases'])
+
+# add up the totals from several logs, e.g., from different jobs
+def merge_totals(totals_list):
+  merged = new_totals()
+  for t in totals_list:
+    for key, value in t.items():
+      if key not in position_fields:
+        merged[key] += value
+  return merged
+
+# given the path to a log file, bring its totals up to date
+# by parsing any lines appended since the totals were last saved,
+# with keep_state=False, no state file is read or written and the
+# whole log is parsed, returns None if the log file cannot be read
+def scan_log(filename, statefile=None, rescan=False, keep_state=True):
+  if statefile is None:
+    statefile = os.path.join(os.path.dirname(filename), 'ckpt_interval.json')
+
+  try:
+    st = os.stat(filename)
+  except OSError:
+    return None
+
+  # pick up where the last invocation left off, if possible
+  totals, offset = new_totals(), 0
+  if not rescan and keep_state:
+    totals, offset = load_state(statefile, st)
+
+  # parse any lines that have been appended since then
+  for offset, l in scrlog.iter_offsets(filename, offset):
+    t, label = scrlog.line_label(l)
+    if label in labels:
+      accumulate(totals, scrlog.parse_line(l))
+
+  if keep_state:
+    save_state(statefile, st, totals, offset)
+  return totals
+
+# Without a level 2 failure, W(T, k) only improves as k grows, which would
+# recommend never flushing.  Since the log has no evidence that flushing
+# less often is safe, we then limit k to the current SCR_FLUSH setting,
+# or to max_flush_unobserved checkpoints per flush if that is not set.
+max_flush_unobserved = 10
+
+# return the largest number of checkpoints per flush to consider
+# when no level 2 failure has been observed
+def unobserved_max_flush():
+  try:
+    flush = int(os.environ.get('SCR_FLUSH', ''))
+    if flush > 0:
+      return flush
+  except ValueError:
+    pass
+  return max_flush_unobserved
+
+# given costs, apply the named model and return the optimum checkpoint interval
+# in seconds, the percent overhead, and the number of checkpoints per flush,
+# returns None if the log has no checkpoint cost or no run time to model yet
+def optimum_interval(c, model):
+  checkpoint_cost = c['checkpoint_cost']
+  avg_secs_before_failure = c['mtti']
+  if checkpoint_cost <= 0.0 or avg_secs_before_failure <= 0.0:
+    return None
+
+  if model == 'young':
+    # "A First Order Approximation to the Optimum Checkpoint Interval",
+    # John Young, 1976.
+    opt_checkpoint_secs = math.sqrt(2.0 * checkpoint_cost * avg_secs_before_failure)
+    opt_checkpoint_overhead = checkpoint_cost * 100.0 / opt_checkpoint_secs
+    return opt_checkpoint_secs, opt_checkpoint_overhead, 1
+
+  if model == 'daly':
+    # "A Higher Order Estimate of the Optimum Checkpoint Interval for Restart Dumps",
+    # John Daly, 2004
+    # See equation 37 from above paper
+    M2 = 2.0 * avg_secs_before_failure # 2M
+    opt_checkpoint_secs = avg_secs_before_failure # t_opt = M
+    if checkpoint_cost < M2: # if delta < 2M
+      f = checkpoint_cost / M2 # delta / 2M
+      opt_checkpoint_secs = math.sqrt(checkpoint_cost * M2) * (1.0 + math.sqrt(f) / 3.0 + f / 9.0) - checkpoint_cost
+    opt_checkpoint_overhead = checkpoint_cost * 100.0 / opt_checkpoint_secs
+    return opt_checkpoint_secs, opt_checkpoint_overhead, 1
+
+  if model == 'multilevel':
+    max_k = 1000
+    if c['level2_rate'] <= 0.0:
+      max_k = unobserved_max_flush()
+    opt = multilevel_interval(c['level1_cost'], c['level2_cost'], c['rebuild_cost'], c['fetch_cost'],
+                              c['level1_rate'], c['level2_rate'], max_k=max_k)
+    if opt is None:
+      # no failures seen yet, checkpoint once per mean time to interrupt and flush every time
+      return avg_secs_before_failure, 0.0, 1
+    opt_checkpoint_secs, opt_flush, opt_waste = opt
+    return opt_checkpoint_secs, opt_waste * 100.0, opt_flush
+
+# print costs and model results for a single log file
+def print_stats(c, model):
+  print("Fetch time total/avg (s): ", c['fetch_secs'], c['fetch_cost'])
+  print("Rebuild time total/avg (s): ", c['rebuild_secs'], c['rebuild_cost'])
+  print("Compute time total/avg (s): ", c['compute_secs'], c['compute_cost'])
+  print("Checkpoint time total/avg (s): ", c['checkpoint_secs'], c['checkpoint_cost'])
+  print("Flush checkpoint time total/avg (s): ", c['flush_ckpt_secs'], c['flush_ckpt_cost'])
+  print("Flush output time total/avg (s): ", c['flush_output_secs'], c['flush_output_cost'])
+  if c['async_flush_count'] > 0.0:
+    print("Async flush time total/avg (s): ", c['async_flush_secs'], c['async_flush_secs'] / c['async_flush_count'])
+    print("Async flush time hidden behind compute (s): ", c['async_hidden_secs'])
+    print("Async flush time exposed (s): ", c['async_exposed_secs'])
+    print("Async flush time exposed during checkpoints (s): ", c['async_in_ckpt_secs'])
+    print("Async flush time exposed outside checkpoints (s): ", c['async_blocked_secs'])
+
+  print("Starts: ", c['num_starts'])
+  print("Total time (s): " + str(c['total_secs']))
+  print("Mean time to interrupt (s): " + str(c['mtti']))
+
+  opt = optimum_interval(c, model)
+  if model == 'young':
+    print("Model = Young")
+  if model == 'daly':
+    print("Model = Daly")
+  if model == 'multilevel':
+    total_secs = c['total_secs']
+    print("Write time total/avg (s): ", c['write_secs'], c['write_cost'])
+    print("Encode time total/avg (s): ", c['encode_secs'], c['encode_cost'])
+    print("Level 1 (cache) checkpoint cost (s): ", c['level1_cost'])
+    print("Level 2 (flush) checkpoint cost (s): ", c['level2_cost'])
+    print("Level 1 (cache) failures, mean time between (s): ", c['level1_failures'],
+      (total_secs / c['level1_failures'] if c['level1_failures'] > 0.0 else float('inf')))
+    print("Level 2 (fetch) failures, mean time between (s): ", c['level2_failures'],
+      (total_secs / c['level2_failures'] if c['level2_failures'] > 0.0 else float('inf')))
+    print("Model = Multilevel")
+  if opt is None:
+    print("Checkpoint Interval (s) = n/a")
+    if model == 'multilevel':
+      print("Checkpoints per Flush = n/a")
+    print("Percent Overhead = n/a")
+    return
+  opt_checkpoint_secs, opt_checkpoint_overhead, opt_flush = opt
+  print("Checkpoint Interval (s) = " + str(opt_checkpoint_secs))
+  if model == 'multilevel':
+    print("Checkpoints per Flush = " + str(opt_flush))
+  print("Percent Overhead = " + str(opt_checkpoint_overhead))
+
+# return the value at fraction q of the sorted list of values (nearest rank)
+def percentile(values, q):
+  if not values:
+    return float('nan')
+  idx = int(math.ceil(q * len(values))) - 1
+  return values[min(max(idx, 0), len(values) - 1)]
+
+# given the log file of a prefix directory, e.g., <prefix>/.scr/log,
+# name the job using the first group of the pattern regex if it matches
+# the path to the log file, or after the prefix directory otherwise
+def job_name(filename, pattern=None):
+  if pattern is not None:
+    m = re.search(pattern, filename)
+    if m:
+      return m.group(1) if m.groups() else m.group(0)
+
+  dirname = os.path.dirname(os.path.abspath(filename))
+  if os.path.basename(dirname) == '.scr':
+    dirname = os.path.dirname(dirname)
+  return os.path.basename(dirname)
+
+# path of the file that saves the totals of a log file in fleet mode,
+# named after a hash of the absolute path of the log, in statedir
+def fleet_statefile(statedir, filename):
+  path = os.path.abspath(filename)
+  return os.path.join(statedir, hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json')
+
+# worker function for the process pool in fleet mode
+def scan_log_worker(job):
+  filename, rescan, statedir = job
+  if statedir is None:
+    return filename, scan_log(filename, keep_state=False)
+  return filename, scan_log(filename, statefile=fleet_statefile(statedir, filename), rescan=rescan)
+
+# scan many log files in a pool of processes and print
+# per-log, per-job name, and aggregate statistics,
+# the totals of each log are only saved between invocations if statedir
+# names a directory to save them in, never next to the logs, which may
+# belong to other users, the pool is from multiprocessing rather than
+# concurrent.futures, which python 2 lacks
+def fleet_stats(filenames, model, procs, rescan, pattern=None, statedir=None):
+  if statedir is not None and not os.path.isdir(statedir):
+    os.makedirs(statedir)
+
+  jobs = [(filename, rescan, statedir) for filename in filenames]
+  chunksize = max(1, len(jobs) // (procs * 8))
+
+  results = dict()
+  pool = multiprocessing.Pool(procs)
+  try:
+    for filename, totals in pool.imap(scan_log_worker, jobs, chunksize):
+      if totals is None:
+        print("ERROR: failed to parse log file:", filename)
+        continue
+      results[filename] = totals
+  finally:
+    pool.terminate()
+    pool.join()
+
+  names = dict((filename, job_name(filename, pattern)) for filename in results)
+  print_fleet_stats(results, names, model, 'Log')
+
+# read the SCR records of all jobs from syslog files in a pool of processes,
+# add up totals for each prefix directory over the runs that used it,
+# and print per-prefix, per-job name, and aggregate statistics
+def syslog_stats(filenames, model, procs, pattern=None):
+  results = dict()
+  names = dict()
+  jobs = scrlog.scan_syslog(filenames, labels=labels, procs=procs)
+  for prefix, runs in jobs.items():
+    # replay the runs in the order they started, as they appear in the text log of the prefix
+    totals = new_totals()
+    for entries in sorted(runs.values(), key=lambda entries: entries[0]['timestamp']):
+      for e in entries:
+        accumulate(totals, e)
+    results[prefix] = totals
+    names[prefix] = job_name(os.path.join(str(prefix), '.scr', 'log'), pattern)
+
+  print_fleet_stats(results, names, model, 'Prefix')
+
+# format the interval and overhead from optimum_interval() for the fleet report
+def format_interval(opt):
+  if opt is None:
+    return "interval=n/a overhead=n/a"
+  return "interval=%f overhead=%f" % (opt[0], opt[1])
+
+# given dictionaries that map each log file (or prefix directory) to its totals
+# and to its job name, print per-log, per-job name, and aggregate statistics
+def print_fleet_stats(results, names, model, kind):
+  # group logs by job name
+  groups = dict()
+  for filename in sorted(results.keys()):
+    groups.setdefault(names[filename], []).append(filename)
+
+  # print per-log results
+  for filename in sorted(results.keys()):
+    c = compute_costs(results[filename])
+    print("%s %s: starts=%d checkpoints=%d checkpoint_cost=%f mtti=%f %s" %
+      (kind, filename, c['num_starts'], c['checkpoint_count'], c['checkpoint_cost'], c['mtti'],
+       format_interval(optimum_interval(c, model))))
+
+  # print stats over logs sharing a job name and over all logs,
+  # percentiles are taken over the average checkpoint cost of each log,
+  # while MTTI and the optimum interval use the merged totals
+  summaries = [(name, groups[name]) for name in sorted(groups.keys())]
+  summaries.append(('ALL', sorted(results.keys())))
+  for name, group in summaries:
+    costs = sorted(compute_costs(results[f])['checkpoint_cost'] for f in group
+                   if results[f]['checkpoint_count'] > 0.0)
+    c = compute_costs(merge_totals([results[f] for f in group]))
+    print("Job %s: logs=%d starts=%d mtti=%f checkpoint_cost min/p50/p90/p99/max=%f/%f/%f/%f/%f %s" %
+      (name, len(group), c['num_starts'], c['mtti'],
+       percentile(costs, 0.0), percentile(costs, 0.50), percentile(costs, 0.90),
+       percentile(costs, 0.99), percentile(costs, 1.0),
+       format_interval(optimum_interval(c, model))))
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(
+    description="Given an SCR log file, estimate optimum checkpoint interval based on checkpoint cost and mean time to interrupt.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('--stats', help='print stats for checkpoint cost and failure rate', action='store_true')
+  parser.add_argument('--model', help='model to compute optimum checkpoint interval', type=str, choices=['young','daly','multilevel'], default='daly')
+  parser.add_argument('--percent', help='express optimum checkpoint interval as percent overhead', action='store_true')
+  parser.add_argument('--flush', help='with the multilevel model, print the number of checkpoints to write between flushes', action='store_true')
+  parser.add_argument('--prefix', help='prefix directory to look for log file', type=str)
+  parser.add_argument('--logfile', help='path to log file', type=str)
+  parser.add_argument('--statefile', help='path to file to save totals between invocations (default: ckpt_interval.json next to log file), with --logs or --loglist, path to a directory to save the totals of each log in, without which nothing is saved and every log is parsed from the start', type=str)
+  parser.add_argument('--logs', help='glob patterns or paths of many log files to analyze together', type=str, nargs='+')
+  parser.add_argument('--loglist', help='file listing paths of log files to analyze together, one per line', type=str)
+  parser.add_argument('--syslog', help='paths of syslog files (plain or gzip) to read SCR records of all jobs from, with SCR_LOG_SYSLOG_ENABLE', type=str, nargs='+')
+  parser.add_argument('--jobname', help='regex whose first group extracts the job name from each log path with --logs, --loglist, or --syslog (default: name of prefix directory)', type=str)
+  parser.add_argument('--procs', help='number of processes used to parse log files with --logs, --loglist, or --syslog', type=int, default=multiprocessing.cpu_count())
+  parser.add_argument('--rescan', help='ignore saved totals and parse the log file from the beginning', action='store_true')
+  args = parser.parse_args(sys.argv[1:])
+
+  # get list of log files in fleet mode
+  filenames = []
+  if args.logs:
+    for pattern in args.logs:
+      matches = glob.glob(pattern)
+      filenames.extend(matches if matches else [pattern])
+  if args.loglist:
+    with open(args.loglist) as f:
+      filenames.extend(l.strip() for l in f if l.strip())
+
+  if args.syslog:
+    syslog_stats(args.syslog, args.model, args.procs, args.jobname)
+    sys.exit(0)
+
+  if filenames:
+    fleet_stats(filenames, args.model, args.procs, args.rescan, args.jobname, args.statefile)
+    sys.exit(0)
+
+  # get path to log file
+  filename = os.path.join('.scr', 'log')
+  if args.prefix:
+    filename = os.path.join(args.prefix, filename)
+  if args.logfile:
+    filename = args.logfile
+
+  totals = scan_log(filename, statefile=args.statefile, rescan=args.rescan)
+  if totals is None:
+    if args.stats:
+      print("ERROR: failed to parse log file:", filename)
+      print("Run this command from within the prefix directory of the job,")
+      print("specify the prefix directory with --prefix, or provide the path to the log file with --logfile")
     else:
-      # print seconds as int
-      print str(int(opt_checkpoint_secs))
-  
-if args.model == 'daly':
-  # "A Higher Order Estimate of the Optimum Checkpoint Interval for Restart Dumps",
-  # John Daly, 2004
-  # See equation 37 from above paper
-  M2 = 2.0 * avg_secs_before_failure # 2M
-  opt_checkpoint_secs = avg_secs_before_failure # t_opt = M
-  if checkpoint_cost < M2: # if delta < 2M
-    f = checkpoint_cost / M2 # delta / 2M
-    opt_checkpoint_secs = math.sqrt(checkpoint_cost * M2) * (1.0 + math.sqrt(f) / 3.0 + f / 9.0) - checkpoint_cost
-  opt_checkpoint_overhead = checkpoint_cost * 100.0 / opt_checkpoint_secs
+      # TODO: check for .scr, if we find that assume this is the first run, if not, report an error
+      # for the first run, let's go wtih 10% overhead until we accumulate some data
+      print("10.0")
+    sys.exit(0)
+
+  c = compute_costs(totals)
   if args.stats:
-    print "Model = Daly"
-    print "Checkpoint Interval (s) = " + str(opt_checkpoint_secs)
-    print "Percent Overhead = " + str(opt_checkpoint_overhead)
+    print_stats(c, args.model)
   else:
-    if args.percent:
+    opt = optimum_interval(c, args.model)
+    if opt is None:
+      # no checkpoint completed yet, use the same defaults as for a missing log
+      print("1" if args.flush and args.model == 'multilevel' else "10.0")
+      sys.exit(0)
+    opt_checkpoint_secs, opt_checkpoint_overhead, opt_flush = opt
+    if args.flush and args.model == 'multilevel':
+      # print number of checkpoints between flushes as int
+      print(str(opt_flush))
+    elif args.percent:
       # print overhead percentage as float
-      print str(opt_checkpoint_overhead)
+      print(str(opt_checkpoint_overhead))
     else:
       # print seconds as int
-      print str(int(opt_checkpoint_secs))
+      print(str(int(opt_checkpoint_secs)))
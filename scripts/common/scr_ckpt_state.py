@@ -0,0 +1,165 @@
+"""
+State file of scr_ckpt_interval.py and the costs computed from it.
+
+scr_ckpt_interval.py adds up the time that the runs recorded in an SCR log
+spent in each phase, and saves these running totals as JSON to a state file
+next to the log, by default <prefix>/.scr/ckpt_interval.json.  This module
+defines the layout of the totals and how average costs and the mean time
+to interrupt are computed from them.  It has no other dependencies, so that
+the scr python module can read the state file as well, e.g.,:
+
+  import scr_ckpt_state
+  saved = scr_ckpt_state.read_state('/p/lustre/run1/.scr/ckpt_interval.json')
+  if saved is not None:
+    print(scr_ckpt_state.compute_costs(saved['totals'])['mtti'])
+"""
+
+import json
+
+# version of the state file layout, bump if fields in new_totals change meaning
+STATE_VERSION = 4
+
+# return a fresh set of running totals
+def new_totals():
+  t = dict()
+
+  # count up number of times job has started,
+  # and the number of jobs, whose first start is not a failure
+  t['num_starts'] = 0.0
+  t['num_jobs']   = 0.0
+
+  # total time spent during fetch and number of times fetch was executed
+  # this will count towards restart cost
+  t['fetch_secs']  = 0.0
+  t['fetch_count'] = 0.0
+
+  # total time spent during rebuild and number of times rebuild was executed
+  # this will count towards restart cost
+  t['rebuild_secs']  = 0.0
+  t['rebuild_count'] = 0.0
+
+  # total time spent during compute phases number of compute phases
+  # counts toward compute time
+  t['compute_secs']  = 0.0
+  t['compute_count'] = 0.0
+
+  # total time spent during checkpoint phases number of checkpoint phases
+  # we'll include this in the checkpoint cost
+  t['checkpoint_secs']  = 0.0
+  t['checkpoint_count'] = 0.0
+
+  # total time spent flushing checkpoints and number of flushed checkpoints
+  # we'll include this in the checkpoint cost
+  t['flush_ckpt_secs']  = 0.0
+  t['flush_ckpt_count'] = 0.0
+
+  # total time spent flushing output and number of flushed outputs (non-checkpoints)
+  # this will be part of the "compute" time
+  t['flush_output_secs']  = 0.0
+  t['flush_output_count'] = 0.0
+
+  # total time spent writing checkpoint files to cache and
+  # applying redundancy encoding, these make up the checkpoint time
+  # and are tracked separately to report per-level costs
+  t['write_secs']   = 0.0
+  t['write_count']  = 0.0
+  t['encode_secs']  = 0.0
+  t['encode_count'] = 0.0
+
+  # total time spent in asynchronous flushes and number of flushes,
+  # the part that overlapped compute phases is hidden from the application,
+  # the part that overlapped checkpoint phases is already in checkpoint_secs,
+  # and the rest blocked the application at some other point, e.g., in finalize
+  t['async_flush_secs']   = 0.0
+  t['async_flush_count']  = 0.0
+  t['async_hidden_secs']  = 0.0
+  t['async_in_ckpt_secs'] = 0.0
+
+  # start times (seconds since epoch) of asynchronous flushes that are still
+  # running, keyed by dataset id, and the compute and checkpoint phases that
+  # completed while they were running as [state, start, end] lists
+  t['async_active'] = dict()
+  t['async_phases'] = list()
+
+  # tracks whether we are in a compute or checkpoint phase
+  # and when that phase started (seconds since epoch)
+  t['state'] = None
+  t['phase_start'] = None
+
+  return t
+
+# read a state file, returns the saved dictionary, with the totals in its
+# 'totals' field, or None if the file cannot be read or was saved with
+# another version of the layout
+def read_state(statefile):
+  try:
+    with open(statefile) as f:
+      saved = json.load(f)
+    if saved['version'] == STATE_VERSION:
+      return saved
+  except (IOError, OSError, ValueError, KeyError, TypeError):
+    pass
+  return None
+
+# given totals, compute average costs and failure rates,
+# returns a dictionary of values used by the models in scr_ckpt_interval.py
+def compute_costs(t):
+  c = dict(t)
+
+  # asynchronous flush time that was not hidden behind compute,
+  # and the part of that not already counted in checkpoint phases,
+  # which is the extra time the application was blocked on flushes
+  c['async_exposed_secs'] = t['async_flush_secs'] - t['async_hidden_secs']
+  c['async_blocked_secs'] = max(c['async_exposed_secs'] - t['async_in_ckpt_secs'], 0.0)
+
+  for name in ['fetch', 'rebuild', 'compute', 'flush_ckpt', 'flush_output', 'write', 'encode']:
+    cost = t[name + '_secs']
+    if t[name + '_count'] > 0.0:
+      cost /= t[name + '_count']
+    c[name + '_cost'] = cost
+
+  # The young and daly models do not account for multi-level checkpointing.
+  # For an approximate single-level cost, sum time spent in checkpoints (write + encode)
+  # and all time flushing checkpoints (but not pure output) and divide by number of tmies we've checkpointed.
+  # Only count asynchronous flush time that blocked the application outside of checkpoint phases.
+  checkpoint_cost = t['checkpoint_secs'] + t['flush_ckpt_secs'] + c['async_blocked_secs']
+  if t['checkpoint_count'] > 0.0:
+    checkpoint_cost /= t['checkpoint_count']
+  c['checkpoint_cost'] = checkpoint_cost
+
+  # for average time before failure, we use total runtime
+  # divided by the number of job starts
+  total_secs = (t['fetch_secs'] + t['rebuild_secs'] + t['compute_secs'] + t['checkpoint_secs'] +
+                t['flush_ckpt_secs'] + t['flush_output_secs'] + c['async_blocked_secs'])
+  avg_secs_before_failure = total_secs
+  if t['num_starts'] > 0.0:
+    avg_secs_before_failure /= t['num_starts']
+  c['total_secs'] = total_secs
+  c['mtti'] = avg_secs_before_failure
+
+  # level 1 is a checkpoint to cache (write + encode), level 2 is a flush
+  level1_cost = t['checkpoint_secs']
+  if t['checkpoint_count'] > 0.0:
+    level1_cost /= t['checkpoint_count']
+  c['level1_cost'] = level1_cost
+
+  # a flush costs the application the time it was blocked,
+  # which for asynchronous flushes excludes time hidden behind compute
+  level2_cost = t['flush_ckpt_secs'] + c['async_blocked_secs']
+  level2_count = t['flush_ckpt_count'] + t['async_flush_count']
+  if level2_count > 0.0:
+    level2_cost /= level2_count
+  c['level2_cost'] = level2_cost
+
+  # a run that had to fetch its checkpoint lost its cache (level 2),
+  # we count every other start as a failure that cache could recover from,
+  # except for the first start of each job, which follows no failure
+  c['level2_failures'] = t['fetch_count']
+  c['level1_failures'] = max(t['num_starts'] - t['num_jobs'] - t['fetch_count'], 0.0)
+  c['level1_rate'] = 0.0
+  c['level2_rate'] = 0.0
+  if total_secs > 0.0:
+    c['level1_rate'] = c['level1_failures'] / total_secs
+    c['level2_rate'] = c['level2_failures'] / total_secs
+
+  return c
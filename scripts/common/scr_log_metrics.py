@@ -0,0 +1,322 @@
+"""
+Given an SCR log file, exports checkpoint and transfer metrics for Prometheus.
+
+Given an SCR log file, maintains histograms of the seconds, bandwidth,
+and number of files of each transfer that SCR records with an xfer=
+entry (WRITE, ENCODE, CHECKPOINT, OUTPUT, FLUSH_SYNC, FLUSH_ASYNC, FETCH),
+along with counters of bytes transferred and of each event= entry.
+
+Each transfer is labeled with its type and with the storage level that
+it writes to, derived from its from and to paths.  Transfers into cache
+(WRITE, ENCODE, CHECKPOINT, OUTPUT, FETCH) are labeled with the cache
+base directory, e.g., /dev/shm, and flushes are labeled "prefix".
+
+The metrics can be served over HTTP for Prometheus to scrape, e.g.,:
+  python scr_log_metrics.py --prefix /p/lustre/run1 --port 9707
+
+or written to a file for the node exporter textfile collector, e.g.,
+from cron:
+  python scr_log_metrics.py --prefix /p/lustre/run1 --textfile /var/lib/node_exporter/scr.prom
+
+Without either option, the metrics are printed once to stdout.
+
+Since the log file only grows, the metrics and the byte offset that has
+been parsed so far are saved to a state file next to the log.  Each scrape
+or invocation only parses the lines appended since then.
+"""
+
+from __future__ import print_function
+
+import sys
+import os
+import json
+import time
+import bisect
+import threading
+import scrlog
+import argparse
+
+# version of the state file layout, bump if fields in new_metrics change meaning
+STATE_VERSION = 1
+
+# upper bounds of histogram buckets, a final +Inf bucket is implied
+secs_buckets  = [0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0]
+bw_buckets    = [1.0e6, 1.0e7, 1.0e8, 2.5e8, 5.0e8, 1.0e9, 2.5e9, 5.0e9, 1.0e10, 2.5e10, 1.0e11]
+files_buckets = [1.0, 4.0, 16.0, 64.0, 256.0, 1024.0, 4096.0, 16384.0, 65536.0]
+
+# return a fresh set of metrics
+def new_metrics():
+  m = dict()
+  m['transfers'] = dict()  # type -> level -> histograms and totals
+  m['events'] = dict()     # event label -> count
+  m['bases'] = []          # cache base directories seen so far
+  m['last_timestamp'] = 0.0
+  return m
+
+# return a fresh set of histograms and totals for one transfer type and level
+def new_transfer():
+  x = dict()
+  x['count'] = 0
+  x['bytes'] = 0.0
+  x['secs']  = [0] * (len(secs_buckets) + 1)
+  x['secs_sum'] = 0.0
+  x['bw']    = [0] * (len(bw_buckets) + 1)
+  x['bw_sum'] = 0.0
+  x['bw_count'] = 0
+  x['files'] = [0] * (len(files_buckets) + 1)
+  x['files_sum'] = 0.0
+  return x
+
+# add a value to a histogram given the upper bounds of its buckets
+def observe(counts, bounds, value):
+  counts[bisect.bisect_left(bounds, value)] += 1
+
+# update metrics with a log entry, skipping lines that hold no record
+def accumulate(m, e):
+  t = e.get('type')
+  if t is None:
+    return
+
+  dt = e.get('timestamp')
+  if dt is not None:
+    m['last_timestamp'] = max(m['last_timestamp'], scrlog.timestamp_seconds(dt))
+
+  if t == 'event':
+    m['events'][e['label']] = m['events'].get(e['label'], 0) + 1
+    return
+
+  level = scrlog.transfer_level(m['bases'], e)
+  x = m['transfers'].setdefault(e['label'], dict()).setdefault(level, new_transfer())
+  secs  = e.get('secs', 0.0)
+  bytes = e.get('bytes', 0.0)
+  files = e.get('files', 0.0)
+
+  x['count'] += 1
+  x['bytes'] += bytes
+  observe(x['secs'], secs_buckets, secs)
+  x['secs_sum'] += secs
+  observe(x['files'], files_buckets, files)
+  x['files_sum'] += files
+  if secs > 0.0:
+    bw = bytes / secs
+    observe(x['bw'], bw_buckets, bw)
+    x['bw_sum'] += bw
+    x['bw_count'] += 1
+
+# read metrics saved by a previous invocation, returns (metrics, offset),
+# starts over from offset 0 if there is no saved state or if it does not
+# describe the current log file, e.g., if the log was replaced or truncated
+def load_state(statefile, st):
+  try:
+    with open(statefile) as f:
+      saved = json.load(f)
+    if (saved['version'] == STATE_VERSION and
+        saved['inode'] == st.st_ino and
+        saved['size'] <= st.st_size and
+        saved['offset'] <= st.st_size):
+      return saved['metrics'], saved['offset']
+  except (IOError, OSError, ValueError, KeyError, TypeError):
+    pass
+  return new_metrics(), 0
+
+# save metrics and offset for the next invocation,
+# this is only an optimization, so ignore errors like a read-only directory
+def save_state(statefile, st, metrics, offset):
+  saved = {
+    'version' : STATE_VERSION,
+    'inode'   : st.st_ino,
+    'size'    : st.st_size,
+    'offset'  : offset,
+    'metrics' : metrics,
+  }
+  tmpfile = statefile + '.tmp'
+  try:
+    with open(tmpfile, 'w') as f:
+      json.dump(saved, f)
+    os.rename(tmpfile, statefile)
+  except (IOError, OSError):
+    pass
+
+# tracks the metrics of one log file, parsing only lines appended
+# since the last update, the lock serializes concurrent scrapes
+class LogMetrics(object):
+  def __init__(self, filename, statefile=None, rescan=False):
+    if statefile is None:
+      statefile = os.path.join(os.path.dirname(filename), 'log_metrics.json')
+    self.filename = filename
+    self.statefile = statefile
+    self.rescan = rescan
+    self.metrics = None
+    self.offset = 0
+    self.inode = None
+    self.lock = threading.Lock()
+
+  # bring metrics up to date with the log file, returns False if it cannot be read
+  def update(self):
+    with self.lock:
+      try:
+        st = os.stat(self.filename)
+      except OSError:
+        return False
+
+      # load saved state on first use, and start over if the log was replaced or truncated
+      if self.metrics is None:
+        self.metrics, self.offset = new_metrics(), 0
+        if not self.rescan:
+          self.metrics, self.offset = load_state(self.statefile, st)
+      elif st.st_ino != self.inode or st.st_size < self.offset:
+        self.metrics, self.offset = new_metrics(), 0
+      self.inode = st.st_ino
+
+      start = self.offset
+      for self.offset, l in scrlog.iter_offsets(self.filename, self.offset):
+        accumulate(self.metrics, scrlog.parse_line(l))
+      if self.offset != start:
+        save_state(self.statefile, st, self.metrics, self.offset)
+      return True
+
+  # update metrics and render them as text
+  def render(self, openmetrics=False):
+    self.update()
+    with self.lock:
+      return render(self.metrics if self.metrics is not None else new_metrics(), openmetrics)
+
+# escape a label value for the exposition format
+def escape(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# format a float sample value
+def fmt(value):
+  if value == float('inf'):
+    return '+Inf'
+  return repr(float(value))
+
+# render metrics in the Prometheus text exposition format (version 0.0.4),
+# or in the OpenMetrics text format if openmetrics is True,
+# which names counter families without their _total suffix and ends with # EOF
+def render(m, openmetrics=False):
+  out = []
+
+  def family(name, mtype, help):
+    if mtype == 'counter' and not openmetrics:
+      name += '_total'
+    out.append('# HELP %s %s' % (name, help))
+    out.append('# TYPE %s %s' % (name, mtype))
+
+  def histogram(name, help, key, bounds, sum_key, count_key):
+    family(name, 'histogram', help)
+    for t in sorted(m['transfers']):
+      for level in sorted(m['transfers'][t]):
+        x = m['transfers'][t][level]
+        labels = 'type="%s",level="%s"' % (escape(t), escape(level))
+        total = 0
+        for bound, count in zip(bounds + [float('inf')], x[key]):
+          total += count
+          out.append('%s_bucket{%s,le="%s"} %d' % (name, labels, fmt(bound), total))
+        out.append('%s_sum{%s} %s' % (name, labels, fmt(x[sum_key])))
+        out.append('%s_count{%s} %d' % (name, labels, x[count_key]))
+
+  histogram('scr_transfer_seconds', 'Seconds per transfer recorded in the SCR log.',
+            'secs', secs_buckets, 'secs_sum', 'count')
+  histogram('scr_transfer_bandwidth_bytes_per_second', 'Bytes per second of each transfer recorded in the SCR log.',
+            'bw', bw_buckets, 'bw_sum', 'bw_count')
+  histogram('scr_transfer_files', 'Number of files per transfer recorded in the SCR log.',
+            'files', files_buckets, 'files_sum', 'count')
+
+  family('scr_transfer_bytes', 'counter', 'Bytes transferred as recorded in the SCR log.')
+  for t in sorted(m['transfers']):
+    for level in sorted(m['transfers'][t]):
+      out.append('scr_transfer_bytes_total{type="%s",level="%s"} %s' %
+        (escape(t), escape(level), fmt(m['transfers'][t][level]['bytes'])))
+
+  family('scr_events', 'counter', 'Number of events recorded in the SCR log.')
+  for label in sorted(m['events']):
+    out.append('scr_events_total{event="%s"} %d' % (escape(label), m['events'][label]))
+
+  family('scr_log_last_timestamp_seconds', 'gauge', 'Time of the most recent record in the SCR log.')
+  out.append('scr_log_last_timestamp_seconds %s' % fmt(m['last_timestamp']))
+
+  if openmetrics:
+    out.append('# EOF')
+  return '\n'.join(out) + '\n'
+
+# write metrics to a file for the node exporter textfile collector,
+# via a temporary file and rename so the collector never reads a partial file
+def write_textfile(lm, path):
+  tmpfile = path + '.tmp'
+  with open(tmpfile, 'w') as f:
+    f.write(lm.render())
+  os.rename(tmpfile, path)
+
+# serve metrics over HTTP at /metrics until interrupted
+def serve(lm, addr, port):
+  try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+  except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+  class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+      if self.path.split('?')[0] not in ('/', '/metrics'):
+        self.send_error(404)
+        return
+      openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+      body = lm.render(openmetrics).encode('utf-8')
+      self.send_response(200)
+      if openmetrics:
+        self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+      else:
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    # keep scrapes out of the terminal
+    def log_message(self, format, *args):
+      pass
+
+  server = HTTPServer((addr, port), Handler)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(
+    description="Given an SCR log file, export checkpoint and transfer metrics for Prometheus.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('--prefix', help='prefix directory to look for log file', type=str)
+  parser.add_argument('--logfile', help='path to log file', type=str)
+  parser.add_argument('--statefile', help='path to file to save metrics between invocations (default: log_metrics.json next to log file)', type=str)
+  parser.add_argument('--port', help='serve metrics over HTTP on this port', type=int)
+  parser.add_argument('--addr', help='address to serve metrics on with --port', type=str, default='127.0.0.1')
+  parser.add_argument('--textfile', help='write metrics to this file for the node exporter textfile collector', type=str)
+  parser.add_argument('--interval', help='with --textfile, rewrite the file every this many seconds instead of once', type=float)
+  parser.add_argument('--openmetrics', help='print metrics in the OpenMetrics format', action='store_true')
+  parser.add_argument('--rescan', help='ignore saved metrics and parse the log file from the beginning', action='store_true')
+  args = parser.parse_args(sys.argv[1:])
+
+  # get path to log file
+  filename = os.path.join('.scr', 'log')
+  if args.prefix:
+    filename = os.path.join(args.prefix, filename)
+  if args.logfile:
+    filename = args.logfile
+
+  lm = LogMetrics(filename, statefile=args.statefile, rescan=args.rescan)
+
+  if args.port is not None:
+    serve(lm, args.addr, args.port)
+  elif args.textfile:
+    while True:
+      write_textfile(lm, args.textfile)
+      if not args.interval:
+        break
+      time.sleep(args.interval)
+  else:
+    if not lm.update():
+      print("ERROR: failed to parse log file:", filename)
+      sys.exit(1)
+    sys.stdout.write(lm.render(args.openmetrics))
@@ -0,0 +1,418 @@
+"""
+Loads SCR log files into a SQLite database.
+
+Given one or more SCR text log files (<prefix>/.scr/log), and optionally
+syslog files holding records that SCR wrote with SCR_LOG_SYSLOG_ENABLE,
+plain or compressed with gzip,
+loads their records into a SQLite database whose tables mirror those
+of the MySQL logging backend defined in scr.mysql (types, usernames,
+jobnames, jobs, transfers, events), e.g.,:
+  python scr_log_sqlite.py --db scr.db --logs '/p/lustre/*/.scr/log'
+  python scr_log_sqlite.py --db scr.db --syslog /var/log/messages
+
+As in scr.mysql, a job is identified by its username and its prefix
+directory, which serves as the job name, so the runs of a job share
+one row in the jobs table.  For a text log, the username is the owner
+of the log file, and the prefix directory is the parent of .scr.
+In addition to the columns of scr.mysql, each event and transfer records
+the host and the resource manager job id of the run that logged it,
+and the log file it came from.
+
+The logs table records how many bytes of each log file have been loaded.
+Later invocations only load records appended since then, and a log that
+has been replaced or truncated is reloaded from the start, so running
+the same command again does not duplicate records.  The rows of each
+chunk of a log and its new offset are committed in the same transaction.
+
+Indexes are created after loading, so the first load of a large history
+does not pay to update them on every insert, e.g., to list the transfers
+of a dataset:
+  sqlite3 scr.db "select * from transfers where dset_id = 12"
+"""
+
+from __future__ import print_function
+
+import sys
+import os
+import glob
+import sqlite3
+import operator
+import scrlog
+import argparse
+
+# tables mirroring scr.mysql, with SQLite types,
+# plus the logs table used to load log files incrementally
+schema = [
+  '''CREATE TABLE IF NOT EXISTS types (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE)''',
+  '''CREATE TABLE IF NOT EXISTS usernames (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE)''',
+  '''CREATE TABLE IF NOT EXISTS jobnames (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE)''',
+  '''CREATE TABLE IF NOT EXISTS hosts (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE)''',
+  '''CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY,
+    username_id INTEGER NOT NULL,
+    jobname_id  INTEGER NOT NULL,
+    start       DATETIME,
+    UNIQUE (username_id, jobname_id))''',
+  '''CREATE TABLE IF NOT EXISTS logs (
+    id     INTEGER PRIMARY KEY,
+    path   TEXT NOT NULL UNIQUE,
+    inode  INTEGER NOT NULL,
+    offset INTEGER NOT NULL)''',
+  '''CREATE TABLE IF NOT EXISTS transfers (
+    id        INTEGER PRIMARY KEY,
+    job_id    INTEGER NOT NULL,
+    type_id   INTEGER NOT NULL,
+    dset_id   INTEGER,
+    dset_name TEXT,
+    start     DATETIME,
+    end       DATETIME,
+    secs      REAL,
+    bytes     REAL,
+    files     INTEGER,
+    bw        REAL,
+    "from"    TEXT,
+    "to"      TEXT,
+    host_id   INTEGER,
+    jobid     TEXT,
+    log_id    INTEGER NOT NULL)''',
+  '''CREATE TABLE IF NOT EXISTS events (
+    id        INTEGER PRIMARY KEY,
+    job_id    INTEGER NOT NULL,
+    type_id   INTEGER NOT NULL,
+    dset_id   INTEGER,
+    dset_name TEXT,
+    start     DATETIME,
+    secs      REAL,
+    note      TEXT,
+    procs     INTEGER,
+    nodes     INTEGER,
+    host_id   INTEGER,
+    jobid     TEXT,
+    log_id    INTEGER NOT NULL)''',
+]
+
+# indexes from scr.mysql, plus lookups by dataset, resource manager job id, and log file
+indexes = [
+  'CREATE INDEX IF NOT EXISTS transfers_jobid_start ON transfers (job_id, start)',
+  'CREATE INDEX IF NOT EXISTS transfers_jobid_typeid_start ON transfers (job_id, type_id, start)',
+  'CREATE INDEX IF NOT EXISTS transfers_typeid_start ON transfers (type_id, start)',
+  'CREATE INDEX IF NOT EXISTS transfers_dset ON transfers (dset_id)',
+  'CREATE INDEX IF NOT EXISTS transfers_rmjobid ON transfers (jobid)',
+  'CREATE INDEX IF NOT EXISTS transfers_log ON transfers (log_id)',
+  'CREATE INDEX IF NOT EXISTS events_jobid_start ON events (job_id, start)',
+  'CREATE INDEX IF NOT EXISTS events_jobid_typeid_start ON events (job_id, type_id, start)',
+  'CREATE INDEX IF NOT EXISTS events_typeid_start ON events (type_id, start)',
+  'CREATE INDEX IF NOT EXISTS events_dset ON events (dset_id)',
+  'CREATE INDEX IF NOT EXISTS events_rmjobid ON events (jobid)',
+  'CREATE INDEX IF NOT EXISTS events_log ON events (log_id)',
+]
+
+# the end time of a transfer is computed by SQLite from its start time
+# and seconds, values are bound by position as
+# (job, type, dset, name, start, secs, bytes, files, bw, from, to, host, jobid, log)
+insert_transfer = '''INSERT INTO transfers
+  (job_id, type_id, dset_id, dset_name, start, end, secs, bytes, files, bw, "from", "to", host_id, jobid, log_id)
+  VALUES (?1, ?2, ?3, ?4, ?5, datetime(?5, printf('+%f seconds', ?6)), ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14)'''
+
+insert_event = '''INSERT INTO events
+  (job_id, type_id, dset_id, dset_name, start, secs, note, procs, nodes, host_id, jobid, log_id)
+  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+# bytes of a log file read and committed at once
+chunk_bytes = 16 * 1024 * 1024
+
+# open the database and create any missing tables
+def connect(dbfile):
+  db = sqlite3.connect(dbfile)
+  db.execute('PRAGMA journal_mode=WAL')
+  db.execute('PRAGMA synchronous=NORMAL')
+  for stmt in schema:
+    db.execute(stmt)
+  db.commit()
+  return db
+
+# maps names to ids in the lookup tables (types, usernames, jobnames, hosts)
+# and (username, jobname) pairs to ids in the jobs table, cached in memory
+class Lookups(object):
+  def __init__(self, db):
+    self.db = db
+    self.reload()
+
+  # read the ids from the database, dropping any cached for rows that
+  # were added in a transaction that was rolled back
+  def reload(self):
+    self.names = dict()
+    for table in ('types', 'usernames', 'jobnames', 'hosts'):
+      self.names[table] = dict((name, id) for id, name in self.db.execute('SELECT id, name FROM ' + table))
+    self.jobs = dict()
+    for id, username_id, jobname_id in self.db.execute('SELECT id, username_id, jobname_id FROM jobs'):
+      self.jobs[(username_id, jobname_id)] = id
+
+  # return the id of a name in a lookup table, adding it if needed
+  def name_id(self, table, name):
+    cache = self.names[table]
+    id = cache.get(name)
+    if id is None:
+      cur = self.db.execute('INSERT INTO ' + table + ' (name) VALUES (?)', (name,))
+      id = cache[name] = cur.lastrowid
+    return id
+
+  # return the id of a job given its username and jobname, adding it if needed
+  def job_id(self, username, jobname, start):
+    key = (self.name_id('usernames', username), self.name_id('jobnames', jobname))
+    id = self.jobs.get(key)
+    if id is None:
+      cur = self.db.execute('INSERT INTO jobs (username_id, jobname_id, start) VALUES (?, ?, ?)',
+                            (key[0], key[1], start))
+      id = self.jobs[key] = cur.lastrowid
+    return id
+
+# yield (end, lines) for each chunk of complete lines in a file,
+# starting from a byte offset, where end is the offset just past the chunk,
+# offsets in a file compressed with gzip count uncompressed bytes, and since
+# such a file is no longer written to, its last line is returned even if
+# it does not end in a newline
+def iter_chunks(filename, offset, compressed=False):
+  if compressed:
+    import gzip
+    f = gzip.open(filename, 'rb')
+  else:
+    f = open(filename, 'rb')
+  with f:
+    f.seek(offset)
+    partial = b''
+    while True:
+      data = f.read(chunk_bytes)
+      if not data:
+        if compressed and partial:
+          yield offset + len(partial), [partial.decode('utf-8', 'replace')]
+        return
+      data = partial + data
+      cut = data.rfind(b'\n') + 1
+      partial = data[cut:]
+      if cut == 0:
+        continue
+      offset += cut
+      yield offset, data[:cut].decode('utf-8', 'replace').splitlines()
+
+split_key = operator.methodcaller('split', '=', 1)
+
+# given a line of a text log, return a dictionary of its raw string values,
+# with quotes removed from quoted values, and with the timestamp as
+# "YYYY-MM-DD HH:MM:SS", or None if the line has no record,
+# SQLite converts numeric strings to numbers on insert based on column type,
+# so this skips the per-field conversions of scrlog.parse_line()
+def split_line(l):
+  if l[19:21] != ': ':
+    return None
+  try:
+    d = dict(map(split_key, l[21:].split(', ')))
+  except ValueError:
+    d = None
+  if d is not None:
+    for key in ('name', 'note'):
+      value = d.get(key)
+      if value is not None:
+        if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+          # a quoted value contained ", ", so fall back to the full parser
+          d = None
+          break
+        d[key] = value[1:-1]
+  if d is None:
+    d = scrlog.parse_line(l)
+    d.pop('timestamp', None)
+    if 'label' in d:
+      d[d.pop('type')] = d.pop('label')
+  d['timestamp'] = l[:10] + ' ' + l[11:19]
+  return d
+
+# given an entry from scrlog.parse_syslog_line(), return a dictionary
+# in the same form as split_line()
+def syslog_fields(e):
+  d = dict(e)
+  dt = d.pop('timestamp', None)
+  d['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S') if dt is not None else None
+  d[d.pop('type')] = d.pop('label')
+  return d
+
+# return a raw value from split_line() as a float, or 0.0 if it is missing or malformed
+def as_float(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return 0.0
+
+# add rows for a list of records from split_line() or syslog_fields(),
+# job gives the job id for records without user and prefix fields
+def insert_records(db, lookups, records, log_id, job=None):
+  transfers = []
+  events = []
+  types = lookups.names['types']
+  hosts = lookups.names['hosts']
+  for d in records:
+    if job is None or 'prefix' in d:
+      job_id = lookups.job_id(d.get('user', ''), d.get('prefix', ''), d['timestamp'])
+    else:
+      job_id = job
+    host = d.get('host')
+    host_id = hosts.get(host) if host is not None else None
+    if host_id is None and host is not None:
+      host_id = lookups.name_id('hosts', host)
+
+    label = d.get('xfer')
+    if label is not None:
+      type_id = types.get(label) or lookups.name_id('types', label)
+      secs = as_float(d.get('secs'))
+      nbytes = as_float(d.get('bytes'))
+      bw = nbytes / secs if secs > 0.0 else 0.0
+      transfers.append((job_id, type_id, d.get('dset'), d.get('name'),
+                        d['timestamp'], secs, nbytes, d.get('files'), bw,
+                        d.get('from'), d.get('to'), host_id, d.get('jobid'), log_id))
+      continue
+
+    label = d.get('event')
+    if label is not None:
+      type_id = types.get(label) or lookups.name_id('types', label)
+      events.append((job_id, type_id, d.get('dset'), d.get('name'),
+                     d['timestamp'], d.get('secs'), d.get('note'), d.get('procs'), d.get('nodes'),
+                     host_id, d.get('jobid'), log_id))
+
+  db.executemany(insert_transfer, transfers)
+  db.executemany(insert_event, events)
+  return len(transfers) + len(events)
+
+# return the id and loaded offset of a log file, registering it if needed,
+# and delete its records if it was replaced or truncated since it was loaded,
+# the offset of a compressed file counts uncompressed bytes, so it is not
+# compared with the file size
+def open_log(db, path, st, compressed=False):
+  row = db.execute('SELECT id, inode, offset FROM logs WHERE path = ?', (path,)).fetchone()
+  if row is None:
+    cur = db.execute('INSERT INTO logs (path, inode, offset) VALUES (?, ?, 0)', (path, st.st_ino))
+    return cur.lastrowid, 0
+
+  log_id, inode, offset = row
+  if inode != st.st_ino or (offset > st.st_size and not compressed):
+    db.execute('DELETE FROM transfers WHERE log_id = ?', (log_id,))
+    db.execute('DELETE FROM events WHERE log_id = ?', (log_id,))
+    db.execute('UPDATE logs SET inode = ?, offset = 0 WHERE id = ?', (st.st_ino, log_id))
+    offset = 0
+  return log_id, offset
+
+# return the username of the owner of a file
+def file_owner(st):
+  try:
+    import pwd
+    return pwd.getpwuid(st.st_uid).pw_name
+  except (ImportError, KeyError):
+    return str(st.st_uid)
+
+# load records appended to a text log or syslog file since it was last loaded,
+# plain or compressed with gzip, returns the number of records added,
+# if loading fails, the ids that lookups cached in the transaction that was
+# rolled back are dropped, so that a later load does not refer to them
+def load_log(db, lookups, filename, syslog=False):
+  try:
+    return _load_log(db, lookups, filename, syslog)
+  except Exception:
+    lookups.reload()
+    raise
+
+def _load_log(db, lookups, filename, syslog):
+  path = os.path.abspath(filename)
+  st = os.stat(path)
+  compressed = scrlog.is_gzip(path)
+  with db:
+    log_id, offset = open_log(db, path, st, compressed)
+
+  # a text log belongs to the job of its prefix directory
+  job = None
+  if not syslog:
+    prefix = os.path.dirname(path)
+    if os.path.basename(prefix) == '.scr':
+      prefix = os.path.dirname(prefix)
+    with db:
+      job = lookups.job_id(file_owner(st), prefix, None)
+
+  year = None
+  if syslog:
+    import time
+    year = time.localtime(st.st_mtime).tm_year
+
+  count = 0
+  for end, lines in iter_chunks(path, offset, compressed):
+    if syslog:
+      records = [syslog_fields(e) for e in (scrlog.parse_syslog_line(l, year) for l in lines) if e is not None]
+    else:
+      records = [d for d in map(split_line, lines) if d is not None]
+    with db:
+      count += insert_records(db, lookups, records, log_id, job)
+      db.execute('UPDATE logs SET offset = ? WHERE id = ?', (end, log_id))
+
+  # record the start of each job as its earliest record
+  with db:
+    db.execute('''UPDATE jobs SET start = (SELECT min(start) FROM
+                    (SELECT min(start) AS start FROM events WHERE job_id = jobs.id
+                     UNION ALL SELECT min(start) FROM transfers WHERE job_id = jobs.id))
+                  WHERE start IS NULL''')
+  return count
+
+# create indexes once all records are loaded
+def create_indexes(db):
+  with db:
+    for stmt in indexes:
+      db.execute(stmt)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(
+    description="Load SCR log files into a SQLite database with tables mirroring scr.mysql.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('--db', help='path to SQLite database file', type=str, default='scr.db')
+  parser.add_argument('--prefix', help='prefix directory to look for log file', type=str)
+  parser.add_argument('--logfile', help='path to log file', type=str)
+  parser.add_argument('--logs', help='glob patterns or paths of many log files to load', type=str, nargs='+')
+  parser.add_argument('--loglist', help='file listing paths of log files to load, one per line', type=str)
+  parser.add_argument('--syslog', help='paths of syslog files (plain or gzip) to load SCR records from', type=str, nargs='+')
+  args = parser.parse_args(sys.argv[1:])
+
+  # get list of text log files
+  filenames = []
+  if args.logs:
+    for pattern in args.logs:
+      matches = glob.glob(pattern)
+      filenames.extend(matches if matches else [pattern])
+  if args.loglist:
+    with open(args.loglist) as f:
+      filenames.extend(l.strip() for l in f if l.strip())
+  if args.logfile:
+    filenames.append(args.logfile)
+  elif args.prefix:
+    filenames.append(os.path.join(args.prefix, '.scr', 'log'))
+  elif not filenames and not args.syslog:
+    filenames.append(os.path.join('.scr', 'log'))
+
+  db = connect(args.db)
+  lookups = Lookups(db)
+
+  rc = 0
+  jobs = [(filename, False) for filename in filenames]
+  jobs.extend((filename, True) for filename in (args.syslog or []))
+  for filename, syslog in jobs:
+    try:
+      count = load_log(db, lookups, filename, syslog)
+      print("Loaded %d records from %s" % (count, filename))
+    except (IOError, OSError) as e:
+      print("ERROR: failed to load log file:", filename, e)
+      rc = 1
+
+  create_indexes(db)
+  db.close()
+  sys.exit(rc)
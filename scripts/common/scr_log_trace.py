@@ -0,0 +1,244 @@
+"""
+Given an SCR log file, exports a timeline of its runs as a Chrome trace.
+
+Given an SCR log file, writes its records as Chrome trace event JSON,
+which can be opened in https://ui.perfetto.dev or chrome://tracing, e.g.,:
+  python scr_log_trace.py --prefix /p/lustre/run1 --output run1.json
+
+Each run, identified by its host and resource manager jobid, is shown as
+a process.  Each pair of X_START and X_END, X_SUCCESS, X_FAIL, or X_FAILURE
+events for the same dataset becomes a slice on the "phases" track of the
+run (COMPUTE, CHECKPOINT, OUTPUT, FLUSH, FETCH, REBUILD, ...), while the
+asynchronous flushes are drawn on their own "async flush" track, so they
+can be seen to overlap the compute phases that run alongside them.
+Each transfer recorded with an xfer= entry becomes a slice on the track
+of the storage level that it writes to, which is the cache base directory,
+e.g., /dev/shm, for WRITE, ENCODE, CHECKPOINT, OUTPUT, and FETCH, and
+"prefix" for flushes.  Other events, like START and HALT, are drawn as
+instant markers.
+
+Slices on the same track that overlap in time are placed on separate
+lanes, e.g., "/dev/shm" and "/dev/shm #2".
+
+The trace is written as the log is read, so memory use does not grow
+with the size of the log, only with the number of runs and of phases
+that are in progress at once.  A phase that is still open after
+--max-open later phases have started, or at the end of the log,
+is drawn as an instant marker.
+
+With SCR_LOG_SYSLOG_ENABLE, the runs of every job on a machine can be
+exported from syslog files instead, e.g.,:
+  python scr_log_trace.py --syslog /var/log/messages --output fleet.json
+"""
+
+from __future__ import print_function
+
+import sys
+import os
+import json
+import scrlog
+import argparse
+from collections import OrderedDict
+
+# suffixes of the events that open and close a phase
+start_suffix = '_START'
+end_suffixes = ('_END', '_SUCCESS', '_FAIL', '_FAILURE')
+
+# events that are logged with the time the phase started rather than when it ended
+start_stamped = frozenset(['RESTART_SUCCESS', 'RESTART_FAIL', 'RESTART_FAILURE'])
+
+# phases drawn on their own track rather than the phases track
+phase_tracks = {
+  'ASYNC_FLUSH' : 'async flush',
+}
+
+# resolution of log timestamps in microseconds
+resolution = 1000000
+
+# fields of a log entry copied to the args of its slice
+arg_fields = ['dset', 'name', 'note', 'from', 'to', 'bytes', 'files', 'procs', 'nodes']
+
+# given an event label, return its phase and whether it opens or closes it,
+# or (None, None) if it does neither
+def phase_of(label):
+  if label.endswith(start_suffix):
+    return label[:-len(start_suffix)], True
+  for suffix in end_suffixes:
+    if label.endswith(suffix):
+      return label[:-len(suffix)], False
+  return None, None
+
+# return seconds since the epoch as integer microseconds used by the trace
+def micros(secs):
+  return int(round(secs * 1e6))
+
+# writes trace events to a file as a single JSON object,
+# one event per line, without holding the events in memory
+class TraceWriter(object):
+  def __init__(self, f, max_open=65536):
+    self.f = f
+    self.max_open = max_open
+    self.count = 0
+
+    # cache base directories seen so far, see scrlog.transfer_level()
+    self.bases = []
+
+    # process id of each run, keyed by (prefix, host, jobid)
+    self.pids = dict()
+
+    # lanes of each track, keyed by (pid, track), as a list of
+    # (tid, end) pairs, where end is the time the last slice on it ends
+    self.tracks = dict()
+    self.tids = dict()
+
+    # open phases, keyed by (pid, phase, dset), in the order they started
+    self.open = OrderedDict()
+
+    self.f.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+
+  def emit(self, event):
+    if self.count > 0:
+      self.f.write(',\n')
+    self.f.write(json.dumps(event, sort_keys=True))
+    self.count += 1
+
+  # return the process id of the run that logged an entry, naming it on first use
+  def pid(self, e):
+    key = (e.get('prefix'), e.get('host'), e.get('jobid'))
+    pid = self.pids.get(key)
+    if pid is None:
+      pid = self.pids[key] = len(self.pids) + 1
+      name = 'jobid=%s host=%s' % (key[2], key[1])
+      if key[0] is not None:
+        name = '%s %s' % (key[0], name)
+      self.emit({'ph': 'M', 'pid': pid, 'tid': 0, 'name': 'process_name', 'args': {'name': name}})
+      self.tids[pid] = 0
+    return pid
+
+  # return the thread id of a lane of a track that is free from start to end,
+  # and the start time of the slice on that lane, since log timestamps are
+  # truncated to whole seconds, a slice may appear to begin up to a second
+  # before the previous slice on its lane ends, and such a slice is clipped
+  # to begin where the previous one ends rather than given a new lane
+  def lane(self, pid, track, start, end):
+    lanes = self.tracks.setdefault((pid, track), [])
+    for i, (tid, lane_end) in enumerate(lanes):
+      if lane_end <= start + resolution:
+        start = max(start, lane_end)
+        lanes[i] = (tid, max(start, end))
+        return tid, start
+
+    tid = self.tids[pid] = self.tids[pid] + 1
+    lanes.append((tid, end))
+    name = track if len(lanes) == 1 else '%s #%d' % (track, len(lanes))
+    self.emit({'ph': 'M', 'pid': pid, 'tid': tid, 'name': 'thread_name', 'args': {'name': name}})
+    self.emit({'ph': 'M', 'pid': pid, 'tid': tid, 'name': 'thread_sort_index', 'args': {'sort_index': tid}})
+    return tid, start
+
+  def slice(self, pid, track, name, start, secs, e, **extra):
+    start, end = micros(start), micros(start + max(secs, 0.0))
+    tid, start = self.lane(pid, track, start, end)
+    dur = max(end - start, 0)
+    args = dict((k, e[k]) for k in arg_fields if k in e)
+    args.update(extra)
+    self.emit({'ph': 'X', 'pid': pid, 'tid': tid, 'name': name, 'cat': track,
+               'ts': start, 'dur': dur, 'args': args})
+
+  def instant(self, pid, name, ts, e, **extra):
+    args = dict((k, e[k]) for k in arg_fields if k in e)
+    args.update(extra)
+    self.emit({'ph': 'i', 's': 'p', 'pid': pid, 'tid': 0, 'name': name,
+               'ts': micros(ts), 'args': args})
+
+  # draw a phase that was opened but never closed as an instant marker
+  def unterminated(self, key, value):
+    ts, e = value
+    self.instant(key[0], key[1] + start_suffix, ts, e, unterminated=True)
+
+  def add(self, e):
+    t = e.get('type')
+    if t is None or 'timestamp' not in e:
+      return
+    ts = scrlog.timestamp_seconds(e['timestamp'])
+    pid = self.pid(e)
+    label = e['label']
+
+    # transfers are logged with their start time
+    if t == 'xfer':
+      track = scrlog.transfer_level(self.bases, e)
+      secs = e.get('secs', 0.0)
+      bw = e.get('bytes', 0.0) / secs if secs > 0.0 else 0.0
+      self.slice(pid, track, label, ts, secs, e, bw=bw)
+      return
+
+    phase, opens = phase_of(label)
+    if phase is None:
+      self.instant(pid, label, ts, e)
+      return
+
+    key = (pid, phase, e.get('dset'))
+    if opens:
+      old = self.open.pop(key, None)
+      if old is not None:
+        self.unterminated(key, old)
+      self.open[key] = (ts, e)
+      if len(self.open) > self.max_open:
+        self.unterminated(*self.open.popitem(last=False))
+      return
+
+    # close the phase, using the logged seconds for its duration when
+    # available since timestamps only have one second resolution
+    secs = e.get('secs')
+    opened = self.open.pop(key, None)
+    if opened is not None:
+      start = opened[0]
+      if secs is None:
+        secs = ts - start
+    elif label in start_stamped:
+      start = ts
+    else:
+      start = ts - (secs or 0.0)
+    status = label[len(phase) + 1:]
+    track = phase_tracks.get(phase, 'phases')
+    self.slice(pid, track, phase, start, secs or 0.0, e, status=status)
+
+  def close(self):
+    while self.open:
+      self.unterminated(*self.open.popitem(last=False))
+    self.f.write('\n]}\n')
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(
+    description="Given an SCR log file, export a timeline of its runs as Chrome trace event JSON.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument('--prefix', help='prefix directory to look for log file', type=str)
+  parser.add_argument('--logfile', help='path to log file', type=str)
+  parser.add_argument('--syslog', help='paths of syslog files (plain or gzip) to read SCR records of all jobs from, instead of a log file', type=str, nargs='+')
+  parser.add_argument('--procs', help='number of processes used to parse syslog files', type=int, default=1)
+  parser.add_argument('--output', help='path to write trace to (default: stdout)', type=str)
+  parser.add_argument('--max-open', help='number of phases to keep open waiting for their end event', type=int, default=65536)
+  args = parser.parse_args(sys.argv[1:])
+
+  # get path to log file
+  filename = os.path.join('.scr', 'log')
+  if args.prefix:
+    filename = os.path.join(args.prefix, filename)
+  if args.logfile:
+    filename = args.logfile
+
+  try:
+    if args.syslog:
+      entries = scrlog.iter_syslog(args.syslog, procs=args.procs)
+    else:
+      entries = scrlog.iter_file(filename)
+  except (IOError, OSError) as e:
+    print("ERROR: failed to open log file:", e)
+    sys.exit(1)
+
+  f = open(args.output, 'w') if args.output else sys.stdout
+  trace = TraceWriter(f, max_open=args.max_open)
+  for e in entries:
+    trace.add(e)
+  trace.close()
+  if args.output:
+    f.close()
@@ -6,11 +6,32 @@ entries = scrlog.parse_file(logfile)
 for e in entries:
   print e
 
+To avoid holding the full log in memory, iterate over entries
+one at a time instead:
+
+for e in scrlog.iter_file(logfile):
+  print e
+
+Both iter_file() and iter_lines() accept optional labels and types
+filters.  Lines whose label or type does not match are skipped before
+they are parsed, e.g.,
+
+for e in scrlog.iter_file(logfile, labels=['CHECKPOINT_END', 'FETCH']):
+  print e
+
+To process only the part of a log that was appended since a previous
+pass, iter_offsets() yields each complete line along with the byte
+offset just past it.  Passing the last offset back in resumes from there:
+
+for offset, l in scrlog.iter_offsets(logfile, offset):
+  e = scrlog.parse_line(l)
+
 Each entry is a dictionary with fields (types)
 depending on its 'type' and 'label' values:
 
   e['type']      (str)      one of {"event", "xfer"}
   e['label']     (str)      e.g., "FETCH", "CHECKPOINT_START"
+  e['host']      (str)      hostname of the process that wrote the record
   e['jobid']     (str)      jobid string from resource manager
   e['from']      (str)      source path
   e['to']        (str)      destination path
@@ -21,115 +42,1072 @@ depending on its 'type' and 'label' values:
   e['timestamp'] (datetime)
   e['note']      (str)
   e['name']      (str)
+  e['procs']     (int)      number of processes in run (START only)
+  e['nodes']     (int)      number of nodes in run (START only)
+  e['user']      (str)      username (syslog only)
+  e['prefix']    (str)      prefix directory of the job (syslog only)
+
+transfer_level() returns the storage level a transfer writes to, which is
+the cache base directory, e.g., /dev/shm, or "prefix" for flushes.  It
+extends a list of the cache base directories seen so far, which is used
+to place FETCH transfers that only record the cache directory:
+
+bases = []
+for e in scrlog.iter_file(logfile, types=['xfer']):
+  print scrlog.transfer_level(bases, e), e['label']
+
+With SCR_LOG_SYSLOG_ENABLE, SCR also writes its records to syslog as
+"user=..., jobid=..., prefix=..., event=..." without a timestamp or host.
+parse_syslog_line() takes a line of a syslog file, like /var/log/messages,
+and returns the entry for the SCR record it holds, or None if it holds none.
+The timestamp and host are taken from the header added by the syslog daemon,
+in RFC 5424, rsyslog ISO, or RFC 3164 form.  Timestamps that carry a UTC
+offset are converted to local time, like those of the SCR log.
+
+To pull the SCR records of every job out of large aggregated syslog files,
+plain or compressed with gzip, iter_syslog() splits the files into blocks on
+line boundaries and parses the blocks in a pool of processes.  scan_syslog()
+returns the records grouped by prefix directory and jobid, with the records
+of each run in time order:
+
+jobs = scrlog.scan_syslog(['/var/log/messages', '/var/log/messages.1.gz'], procs=16)
+for prefix, runs in jobs.items():
+  for jobid, entries in runs.items():
+    print prefix, jobid, len(entries)
+
+To avoid parsing the text log again on every pass, update_index() writes
+a binary sidecar file (by default <logfile>.idx, e.g., .scr/log.idx) that
+holds every record in a fixed-width layout, along with a table of the
+strings used in the records.  The sidecar notes how much of the text log
+it covers, so later calls only parse lines appended since then.
+open_index() brings the sidecar up to date and maps it into memory:
+
+with scrlog.open_index(logfile) as idx:
+  for e in idx:
+    print e
+
+Entries read from the index have the same fields as those from
+parse_line(), plus e['offset'], the byte offset of the line in the
+text log.  With NumPy, idx.records is a structured array that views
+the mapped file without copying, and idx.strings maps the string
+codes in its label, jobid, host, name, note, from, and to fields.
+
+To find records for a dataset or a time range without scanning the whole
+log, query() uses a small sparse index (by default <logfile>.sparse) that
+notes the byte offset, timestamp range, and dataset id range of each block
+of lines.  It seeks directly to the blocks that may hold matching records:
+
+start = datetime(2020, 1, 1, 2, 0, 0)
+end   = datetime(2020, 1, 1, 3, 0, 0)
+for e in scrlog.query(logfile, start=start, end=end):
+  print e
+
+for e in scrlog.query(logfile, dset=4512):
+  print e
+
+To watch a log while a job runs, follow() tails it like "tail -f".
+It yields an entry for each complete line as SCR appends it, and waits
+for more lines with inotify where available, checking the file size
+every interval seconds as well, since inotify does not see appends made
+from other nodes on network file systems:
+
+for e in scrlog.follow(logfile, labels=['CHECKPOINT_END', 'FLUSH_ASYNC']):
+  print e
 """
 
-import re
+import io
+import os
+import sys
+import mmap
+import select
+import bisect
+import time
+import calendar
+import struct
+from array import array
 from datetime import datetime, timedelta
-from dateutil import parser
-
-# define regular expressions to pluck out field values
-re_time  = re.compile(r'^(\d\d\d\d\-\d\d\-\d\dT\d\d:\d\d:\d\d)')
-re_jobid = re.compile(r'^jobid=(.*)$')
-re_event = re.compile(r'^event=(.*)$')
-re_xfer  = re.compile(r'^xfer=(.*)$')
-re_from  = re.compile(r'^from=(.*)$')
-re_to    = re.compile(r'^to=(.*)$')
-re_secs  = re.compile(r'^secs=(\d+\.\d+)$')
-re_dset  = re.compile(r'^dset=(\d+)$')
-re_bytes = re.compile(r'^bytes=(\d+\.\d+)$')
-re_files = re.compile(r'^files=(\d+)$')
-re_name  = re.compile(r'.* name=\"(.*?)\"')
-re_note  = re.compile(r'.* note=\"(.*?)\"')
+
+# determine whether we have python 2 or 3
+_PY3 = (sys.version_info[0] >= 3)
+
+# cache of timestamp strings already converted to datetime objects,
+# many records share the same second, so this saves most conversions
+timestamps = dict()
+max_timestamps = 4096
+
+# map each key written by scr_log.c to the entry field it sets and the
+# function used to convert its value, keys not listed here are ignored,
+# event= and xfer= are handled separately since they set both type and label
+converters = {
+  'host'  : ('host',  str),
+  'jobid' : ('jobid', str),
+  'from'  : ('from',  str),
+  'to'    : ('to',    str),
+  'dset'  : ('dset',  int),
+  'secs'  : ('secs',  float),
+  'bytes' : ('bytes', float),
+  'files' : ('files', float),
+  'procs' : ('procs', int),
+  'nodes' : ('nodes', int),
+  'note'  : ('note',  str),
+  'name'  : ('name',  str),
+  'user'  : ('user',  str),
+  'prefix': ('prefix', str),
+}
+
+# given a timestamp string, return a datetime object,
+# scr_log.c writes timestamps with strftime("%Y-%m-%dT%H:%M:%S"),
+# so slice out the fields directly and only fall back to dateutil
+# if the string is in some other format
+def parse_timestamp(ts):
+  dt = timestamps.get(ts)
+  if dt is not None:
+    return dt
+
+  try:
+    if len(ts) != 19 or ts[4] != '-' or ts[7] != '-' or ts[10] != 'T' or ts[13] != ':' or ts[16] != ':':
+      raise ValueError(ts)
+    dt = datetime(int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                  int(ts[11:13]), int(ts[14:16]), int(ts[17:19]))
+  except ValueError:
+    from dateutil import parser
+    dt = parser.parse(ts)
+
+  # keep the cache bounded for logs that span many distinct seconds
+  if len(timestamps) >= max_timestamps:
+    timestamps.clear()
+  timestamps[ts] = dt
+  return dt
+
+# cache of datetime objects already converted to seconds since the epoch
+seconds = dict()
+
+# given a datetime object from parse_timestamp(), return seconds since the epoch
+def timestamp_seconds(dt):
+  secs = seconds.get(dt)
+  if secs is None:
+    if len(seconds) >= max_timestamps:
+      seconds.clear()
+    secs = time.mktime(dt.timetuple())
+    seconds[dt] = secs
+  return secs
 
 # given a line, parse into a dictionary of key=value pairs
 def parse_line(l):
   e = dict()
 
-  # most fields we can split out by comma's
-  # though there are some fields whose values may have embedded commas
-
-  # handle fields that we can get by splitting commas
-  parts = l.split(", ")
-  for p in parts:
-    m = re_jobid.match(p)
-    if m:
-      jobid = m.groups(1)[0]
-      e['jobid'] = jobid
-      continue 
-
-    m = re_event.match(p)
-    if m:
-      label = m.groups(1)[0]
-      e['type'] = 'event'
-      e['label'] = label
-      continue 
-
-    m = re_xfer.match(p)
-    if m:
-      label = m.groups(1)[0]
-      e['type'] = 'xfer'
-      e['label'] = label
-      continue 
-    
-    m = re_from.match(p)
-    if m:
-      path = m.groups(1)[0]
-      e['from'] = path
-      continue 
-    
-    m = re_to.match(p)
-    if m:
-      path = m.groups(1)[0]
-      e['to'] = path
-      continue 
-    
-    m = re_dset.match(p)
-    if m:
-      dset = int(m.groups(1)[0])
-      e['dset'] = dset
-      continue 
-
-    m = re_secs.match(p)
-    if m:
-      secs = float(m.groups(1)[0])
-      e['secs'] = secs
-      continue 
-
-    m = re_bytes.match(p)
-    if m:
-      byte_count = float(m.groups(1)[0])
-      e['bytes'] = byte_count 
-      continue 
-
-    m = re_files.match(p)
-    if m:
-      files = float(m.groups(1)[0])
-      e['files'] = files
-      continue 
-
-  # handle fields that might have commas
-  m = re_time.match(l)
-  if m:
-    timestamp = m.groups(1)[0]
-    dt = parser.parse(timestamp)
-    e['timestamp'] = dt
-
-  m = re_note.match(l)
-  if m:
-    note = m.groups(1)[0]
-    e['note'] = note
-
-  m = re_name.match(l)
-  if m:
-    name = m.groups(1)[0]
-    e['name'] = name
+  l = l.rstrip('\n')
+
+  # text log records start with a fixed-width timestamp: "%Y-%m-%dT%H:%M:%S: "
+  if l[19:21] == ': ':
+    e['timestamp'] = parse_timestamp(l[:19])
+    l = l[21:]
+
+  # fields are separated by ", ", but quoted values like note="..."
+  # and name="..." may contain that separator, so glue split pieces
+  # back together until we find the closing quote
+  parts = l.split(', ')
+  num_parts = len(parts)
+  i = 0
+  while i < num_parts:
+    key, sep, value = parts[i].partition('=')
+    i += 1
+    if value[:1] == '"':
+      while not value.endswith('"') and i < num_parts:
+        value += ', ' + parts[i]
+        i += 1
+      value = value[1:-1]
+
+    if key == 'event' or key == 'xfer':
+      e['type'] = key
+      e['label'] = value
+      continue
+
+    conv = converters.get(key)
+    if conv is not None:
+      field, func = conv
+      try:
+        e[field] = func(value)
+      except ValueError:
+        # skip malformed values rather than failing the whole line
+        pass
 
   return e
 
-def parse_file(filename):
-  entries = []
-  with open(filename) as f:
-    for l in f.readlines():
+# month abbreviations used in traditional (RFC 3164) syslog timestamps
+syslog_months = {
+  'Jan' : 1, 'Feb' : 2, 'Mar' : 3, 'Apr' : 4,  'May' : 5,  'Jun' : 6,
+  'Jul' : 7, 'Aug' : 8, 'Sep' : 9, 'Oct' : 10, 'Nov' : 11, 'Dec' : 12,
+}
+
+# given an ISO 8601 timestamp from a syslog header, e.g.,
+# "2020-01-01T02:00:00.123456+02:00", return a datetime in local time,
+# like the timestamps of the SCR log, so that records from hosts that log
+# in other time zones stay in order, fractional seconds are dropped,
+# and a timestamp without a UTC offset is taken to be in local time
+def _syslog_timestamp(ts):
+  zone = ts[19:].lstrip('.0123456789')
+  if not zone:
+    return parse_timestamp(ts[:19])
+
+  key = ts[:19] + zone
+  dt = timestamps.get(key)
+  if dt is not None:
+    return dt
+
+  if zone in ('Z', 'z'):
+    offset = 0
+  elif zone[0] in '+-' and len(zone) in (5, 6):
+    offset = int(zone[1:3]) * 3600 + int(zone[-2:]) * 60
+    if zone[0] == '-':
+      offset = -offset
+  else:
+    raise ValueError(ts)
+  utc = parse_timestamp(ts[:19])
+  dt = datetime.fromtimestamp(calendar.timegm(utc.timetuple()) - offset)
+
+  if len(timestamps) >= max_timestamps:
+    timestamps.clear()
+  timestamps[key] = dt
+  return dt
+
+# given a line from a syslog file, return an entry for the SCR record it holds,
+# or None if it does not hold one, the syslog daemon prepends a header like
+# "<13>1 2020-01-01T02:00:00.123456+02:00 host1 scr 100 - - " (RFC 5424),
+# "2020-01-01T02:00:00.123456+02:00 host1 scr[100]: " (rsyslog ISO format),
+# or "Jan  1 02:00:00 host1 scr[100]: " (RFC 3164), which omits the year,
+# so year gives the year to use for those, defaulting to the current year,
+# the <PRI> part is only found in files written from network messages
+def parse_syslog_line(l, year=None):
+  start = l.find('user=')
+  if start < 0 or (l.find(', event=', start) < 0 and l.find(', xfer=', start) < 0):
+    return None
+
+  e = parse_line(l[start:])
+  header = l[:start].split()
+
+  # drop <PRI>, which RFC 5424 follows with its VERSION, and RFC 3164
+  # follows directly with the timestamp
+  if header and header[0].startswith('<'):
+    rest = header[0][header[0].find('>') + 1:]
+    if rest.isdigit() or not rest:
+      header = header[1:]
+    else:
+      header[0] = rest
+
+  try:
+    if len(header) >= 2 and header[0][4:5] == '-' and header[0][10:11] == 'T':
+      e['timestamp'] = _syslog_timestamp(header[0])
+      e['host'] = header[1]
+    elif len(header) >= 4 and header[0] in syslog_months:
+      hms = header[2]
+      e['timestamp'] = datetime(year or datetime.now().year, syslog_months[header[0]], int(header[1]),
+                                int(hms[0:2]), int(hms[3:5]), int(hms[6:8]))
+      e['host'] = header[3]
+  except ValueError:
+    pass
+  return e
+
+# transfer types whose destination is cache, flushes go to the prefix directory
+cache_types = frozenset(['WRITE', 'ENCODE', 'CHECKPOINT', 'OUTPUT', 'FETCH'])
+
+# given a path in cache, return the cache base directory it falls under,
+# preferring the longest base in bases, and otherwise guessing from
+# the first two components of the path, e.g., /dev/shm or /l/ssd
+def cache_level(bases, path):
+  best = None
+  for base in bases:
+    if (path == base or path.startswith(base.rstrip('/') + '/')) and (best is None or len(base) > len(best)):
+      best = base
+  if best is not None:
+    return best
+  return '/'.join(path.split('/')[:3]) or path
+
+# return the storage level a transfer writes to, adding the cache base
+# directory it records to bases if it is not there yet
+def transfer_level(bases, e):
+  t = e['label']
+  if t not in cache_types:
+    return 'prefix'
+
+  # WRITE, ENCODE, CHECKPOINT, and OUTPUT record the cache base as their
+  # source, while FETCH records the cache directory as its destination
+  if t == 'FETCH':
+    return cache_level(bases, e.get('to', ''))
+  base = e.get('from', '')
+  if base and base not in bases:
+    bases.append(base)
+  return base
+
+# given a line, return a (type, label) tuple by scanning for the
+# event= or xfer= field, returns (None, None) if neither is found
+def line_label(l):
+  for key, t in ((', event=', 'event'), (', xfer=', 'xfer')):
+    start = l.find(key)
+    if start >= 0:
+      start += len(key)
+      end = l.find(',', start)
+      if end < 0:
+        end = len(l)
+      return t, l[start:end].rstrip()
+  return None, None
+
+# given an iterable of lines, yield one entry per line,
+# optionally skipping lines whose label or type is not in
+# the labels or types collections
+def iter_lines(lines, labels=None, types=None):
+  if labels is not None:
+    labels = frozenset(labels)
+  if types is not None:
+    types = frozenset(types)
+  filtering = (labels is not None or types is not None)
+
+  for l in lines:
+    if filtering:
+      t, label = line_label(l)
+      if types is not None and t not in types:
+        continue
+      if labels is not None and label not in labels:
+        continue
+    yield parse_line(l)
+
+# given a file name and a starting byte offset, yield an (end, line) tuple
+# for each complete line, where end is the byte offset just past that line,
+# a trailing line without a newline is still being written and is not returned,
+# so a later call can resume from the last end offset that was yielded
+def iter_offsets(filename, offset=0):
+  with open(filename, 'rb') as f:
+    f.seek(offset)
+    for raw in f:
+      if not raw.endswith(b'\n'):
+        break
+      offset += len(raw)
+      if _PY3:
+        yield offset, raw.decode('utf-8', 'replace')
+      else:
+        yield offset, raw
+
+def _iter_handle(f, labels, types):
+  with f:
+    for e in iter_lines(f, labels=labels, types=types):
+      yield e
+
+# given a file name, return a generator that yields one entry per line,
+# the file is opened immediately so that a missing or unreadable file
+# raises an error at call time rather than on first iteration
+def iter_file(filename, labels=None, types=None):
+  f = open(filename)
+  return _iter_handle(f, labels, types)
+
+def parse_file(filename, labels=None, types=None):
+  return list(iter_file(filename, labels=labels, types=types))
+
+# numeric fields stored in parse_columns() with their array typecode
+# and the value used when a record does not set the field
+numeric_columns = [
+  ('dset',  'l', -1),
+  ('secs',  'd', float('nan')),
+  ('bytes', 'd', float('nan')),
+  ('files', 'd', float('nan')),
+]
+
+# string fields stored in parse_columns() as small integer category codes
+category_columns = ['type', 'label', 'jobid', 'host']
+
+# given a file name, return a dictionary of typed column arrays,
+# one element per record, see module docstring for the layout
+def parse_columns(filename, labels=None, types=None, numpy=True):
+  nan = float('nan')
+
+  cols = dict()
+  cols['timestamp'] = array('d')
+  for field, typecode, missing in numeric_columns:
+    cols[field] = array(typecode)
+  for field in category_columns:
+    cols[field] = array('i')
+
+  # map each distinct string to its code, and each code back to its string
+  codes = dict((field, dict()) for field in category_columns)
+  names = dict((field, list()) for field in category_columns)
+
+  count = 0
+  for e in iter_file(filename, labels=labels, types=types):
+    count += 1
+
+    dt = e.get('timestamp')
+    if dt is not None:
+      cols['timestamp'].append(timestamp_seconds(dt))
+    else:
+      cols['timestamp'].append(nan)
+
+    for field, typecode, missing in numeric_columns:
+      cols[field].append(e.get(field, missing))
+
+    for field in category_columns:
+      value = e.get(field)
+      code = codes[field].get(value)
+      if code is None:
+        code = len(names[field])
+        codes[field][value] = code
+        names[field].append(value)
+      cols[field].append(code)
+
+  # wrap arrays as numpy arrays without copying if numpy is available
+  if numpy:
+    try:
+      import numpy as np
+      for field in list(cols.keys()):
+        cols[field] = np.frombuffer(cols[field], dtype=cols[field].typecode)
+    except ImportError:
+      pass
+
+  cols['count'] = count
+  cols['names'] = names
+  return cols
+
+# layout of the sidecar index file:
+#   header, fixed-width records, string table
+# the header records the size, mtime, and inode of the text log,
+# the byte offset in the text log that the records cover,
+# the number of records, and the file offset of the string table
+index_magic   = b'SCRLOGIX'
+index_dirty   = b'SCRLOGI~'
+index_version = 1
+index_header  = struct.Struct('<8sIIQQdQQQ')
+
+# each record holds the fields below, the type is 0 if not set, 1 for event,
+# and 2 for xfer, string fields hold a code into the string table where
+# 0 means the field was not set, numeric fields use the same missing values
+# as parse_columns(), and offset is the byte offset of the line in the text log
+index_record = struct.Struct('<ddddqqB3xIIIIIIIii')
+index_fields = [
+  'timestamp', 'secs', 'bytes', 'files', 'dset', 'offset', 'type',
+  'label', 'jobid', 'host', 'name', 'note', 'from', 'to', 'procs', 'nodes',
+]
+index_formats = ['<f8', '<f8', '<f8', '<f8', '<i8', '<i8', 'u1',
+  '<u4', '<u4', '<u4', '<u4', '<u4', '<u4', '<u4', '<i4', '<i4']
+index_offsets = [0, 8, 16, 24, 32, 40, 48, 52, 56, 60, 64, 68, 72, 76, 80, 84]
+index_strings = ['label', 'jobid', 'host', 'name', 'note', 'from', 'to']
+index_types   = [None, 'event', 'xfer']
+
+# read and return header tuple of index file, or None if it is not a valid index
+def _read_index_header(f):
+  f.seek(0)
+  data = f.read(index_header.size)
+  if len(data) != index_header.size:
+    return None
+  header = index_header.unpack(data)
+  if header[0] != index_magic or header[1] != index_version or header[2] != index_record.size:
+    return None
+  return header
+
+# read string table that starts at the given file offset
+def _read_index_strings(buf, offset):
+  count, = struct.unpack_from('<I', buf, offset)
+  offset += 4
+  strings = [None]
+  for i in range(count):
+    n, = struct.unpack_from('<I', buf, offset)
+    offset += 4
+    s = bytes(buf[offset:offset + n])
+    strings.append(s.decode('utf-8') if _PY3 else s)
+    offset += n
+  return strings
+
+# pack an entry from parse_line() into a record,
+# adding any new strings to the strings list and codes dictionary
+def _pack_index_record(e, offset, strings, codes):
+  nan = float('nan')
+  dt = e.get('timestamp')
+  values = [
+    timestamp_seconds(dt) if dt is not None else nan,
+    e.get('secs', nan), e.get('bytes', nan), e.get('files', nan),
+    e.get('dset', -1), offset, index_types.index(e.get('type')),
+  ]
+  for field in index_strings:
+    value = e.get(field)
+    code = codes.get(value)
+    if code is None:
+      code = len(strings)
+      codes[value] = code
+      strings.append(value)
+    values.append(code)
+  values.append(e.get('procs', -1))
+  values.append(e.get('nodes', -1))
+  return index_record.pack(*values)
+
+# create or bring up to date the sidecar index file of the given log file,
+# returns the path to the index file
+def update_index(filename, idxfile=None):
+  if idxfile is None:
+    idxfile = filename + '.idx'
+
+  st = os.stat(filename)
+
+  # check whether an existing index describes an earlier state of this log
+  header = None
+  f = None
+  try:
+    f = open(idxfile, 'r+b')
+    header = _read_index_header(f)
+    if header is not None and (header[6] != st.st_ino or header[3] > st.st_size or header[4] > st.st_size):
+      header = None
+  except (IOError, OSError):
+    pass
+
+  if header is not None and header[4] == st.st_size and header[5] == st.st_mtime:
+    # index is up to date
+    f.close()
+    return idxfile
+
+  if header is not None:
+    # read string table, then drop it so new records can be appended in its place
+    magic, version, record_size, covered, size, mtime, inode, count, strings_offset = header
+    f.seek(strings_offset)
+    strings = _read_index_strings(f.read(), 0)
+  else:
+    # start a new index
+    if f is not None:
+      f.close()
+    f = open(idxfile, 'w+b')
+    covered, count = 0, 0
+    strings_offset = index_header.size
+    strings = [None]
+
+  codes = dict((value, code) for code, value in enumerate(strings))
+
+  with f:
+    # mark the index as being modified, so that if we are interrupted,
+    # the next call starts over rather than trusting a partial update
+    f.seek(0)
+    f.write(index_header.pack(index_dirty, index_version, index_record.size,
+      covered, 0, 0.0, st.st_ino, count, strings_offset))
+
+    # append records for lines added to the text log since the last update
+    f.seek(strings_offset)
+    f.truncate()
+    chunk = []
+    for end, l in iter_offsets(filename, covered):
+      chunk.append(_pack_index_record(parse_line(l), covered, strings, codes))
+      covered = end
+      count += 1
+      if len(chunk) >= 4096:
+        f.write(b''.join(chunk))
+        chunk = []
+    f.write(b''.join(chunk))
+
+    # write string table
+    strings_offset = f.tell()
+    table = [struct.pack('<I', len(strings) - 1)]
+    for value in strings[1:]:
+      data = value.encode('utf-8') if _PY3 else value
+      table.append(struct.pack('<I', len(data)))
+      table.append(data)
+    f.write(b''.join(table))
+
+    # write final header
+    f.seek(0)
+    f.write(index_header.pack(index_magic, index_version, index_record.size,
+      covered, st.st_size, st.st_mtime, st.st_ino, count, strings_offset))
+
+  return idxfile
+
+# read-only view of a sidecar index file, use open_index() to create one
+class LogIndex(object):
+  def __init__(self, idxfile):
+    with open(idxfile, 'rb') as f:
+      header = _read_index_header(f)
+      if header is None:
+        raise ValueError("not a valid SCR log index: " + idxfile)
+      self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, record_size, covered, size, mtime, inode, count, strings_offset = header
+    self.covered = covered
+    self.size    = size
+    self.mtime   = mtime
+    self.inode   = inode
+    self.count   = count
+    self.strings = _read_index_strings(self._map, strings_offset)
+
+    # view the records in place if numpy is available
+    self.records = None
+    try:
+      import numpy as np
+      dtype = np.dtype({'names': index_fields, 'formats': index_formats,
+                        'offsets': index_offsets, 'itemsize': index_record.size})
+      self.records = np.frombuffer(self._map, dtype=dtype, count=count, offset=index_header.size)
+    except ImportError:
+      pass
+
+  def __len__(self):
+    return self.count
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def close(self):
+    # drop our numpy view before closing the map it points into
+    self.records = None
+    self._map.close()
+
+  # return the raw field values of record i as a tuple in index_fields order
+  def record(self, i):
+    if i < 0 or i >= self.count:
+      raise IndexError(i)
+    return index_record.unpack_from(self._map, index_header.size + i * index_record.size)
+
+  # return record i as an entry in the format of parse_line()
+  def entry(self, i):
+    values = self.record(i)
+    e = dict()
+    for field, value in zip(index_fields, values):
+      if field == 'timestamp':
+        if value == value:
+          e[field] = datetime.fromtimestamp(value)
+      elif field == 'type':
+        if value:
+          e[field] = index_types[value]
+      elif field in index_strings:
+        if value:
+          e[field] = self.strings[value]
+      elif field == 'files' or field == 'secs' or field == 'bytes':
+        if value == value:
+          e[field] = value
+      elif field == 'offset':
+        e[field] = value
+      elif value != -1:
+        e[field] = value
+    return e
+
+  def __getitem__(self, i):
+    return self.entry(i)
+
+  def __iter__(self):
+    for i in range(self.count):
+      yield self.entry(i)
+
+# bring the sidecar index of the given log file up to date and open it,
+# raises ValueError if the index does not match the current log file,
+# which can happen with update=False or if the log changes while opening
+def open_index(filename, idxfile=None, update=True):
+  if idxfile is None:
+    idxfile = filename + '.idx'
+  if update:
+    update_index(filename, idxfile)
+
+  idx = LogIndex(idxfile)
+  st = os.stat(filename)
+  if idx.inode != st.st_ino or idx.size != st.st_size or idx.mtime != st.st_mtime:
+    idx.close()
+    raise ValueError("SCR log index is out of date: " + idxfile)
+  return idx
+
+# layout of the sparse index file:
+#   header, one entry per block of lines
+# like the sidecar index, the header records the size, mtime, and inode
+# of the text log and the byte offset in the text log that the blocks cover
+sparse_magic   = b'SCRLOGSP'
+sparse_version = 1
+sparse_header  = struct.Struct('<8sIIQQdQQ')
+
+# each block records the byte offset of its first line, its number of lines,
+# the min and max timestamp in seconds since the epoch (NaN if none),
+# and the min and max dataset id (-1 if none)
+sparse_block = struct.Struct('<qqddqq')
+
+# read sparse index file, returns (header, blocks) or None if not valid
+def _read_sparse_index(sparsefile):
+  try:
+    with open(sparsefile, 'rb') as f:
+      data = f.read()
+  except (IOError, OSError):
+    return None
+  if len(data) < sparse_header.size:
+    return None
+  header = sparse_header.unpack_from(data, 0)
+  magic, version, block_lines, covered, size, mtime, inode, count = header
+  if magic != sparse_magic or version != sparse_version or len(data) != sparse_header.size + count * sparse_block.size:
+    return None
+  blocks = [sparse_block.unpack_from(data, sparse_header.size + i * sparse_block.size) for i in range(count)]
+  return header, blocks
+
+# create or bring up to date the sparse index of the given log file,
+# every block_lines lines, note the byte offset, timestamp range, and dataset range,
+# returns the list of blocks
+def update_sparse_index(filename, sparsefile=None, block_lines=1024):
+  if sparsefile is None:
+    sparsefile = filename + '.sparse'
+
+  st = os.stat(filename)
+
+  # reuse blocks of an existing index if the log has only grown since then
+  blocks = []
+  saved = _read_sparse_index(sparsefile)
+  if saved is not None:
+    header, blocks = saved
+    magic, version, saved_lines, covered, size, mtime, inode, count = header
+    if inode != st.st_ino or size > st.st_size or covered > st.st_size or saved_lines != block_lines:
+      blocks = []
+    elif size == st.st_size and mtime == st.st_mtime:
+      return blocks
+
+  # the last block may be partially filled, so scan again from its start
+  offset = 0
+  if blocks:
+    offset = blocks.pop()[0]
+
+  nan = float('nan')
+  start, nlines, min_ts, max_ts, min_dset, max_dset = offset, 0, nan, nan, -1, -1
+  covered = offset
+  for end, l in iter_offsets(filename, offset):
+    e = parse_line(l)
+    dt = e.get('timestamp')
+    if dt is not None:
+      ts = timestamp_seconds(dt)
+      if not (min_ts <= ts):
+        min_ts = ts
+      if not (max_ts >= ts):
+        max_ts = ts
+    dset = e.get('dset')
+    if dset is not None:
+      if min_dset == -1 or dset < min_dset:
+        min_dset = dset
+      if max_dset == -1 or dset > max_dset:
+        max_dset = dset
+    nlines += 1
+    covered = end
+    if nlines == block_lines:
+      blocks.append((start, nlines, min_ts, max_ts, min_dset, max_dset))
+      start, nlines, min_ts, max_ts, min_dset, max_dset = end, 0, nan, nan, -1, -1
+  if nlines > 0:
+    blocks.append((start, nlines, min_ts, max_ts, min_dset, max_dset))
+
+  # the sparse index is small, so write a new copy and rename it into place
+  data = [sparse_header.pack(sparse_magic, sparse_version, block_lines,
+    covered, st.st_size, st.st_mtime, st.st_ino, len(blocks))]
+  for b in blocks:
+    data.append(sparse_block.pack(*b))
+  tmpfile = sparsefile + '.tmp'
+  with open(tmpfile, 'wb') as f:
+    f.write(b''.join(data))
+  os.rename(tmpfile, sparsefile)
+
+  return blocks
+
+# given a datetime or seconds since the epoch, return seconds since the epoch
+def _query_seconds(value):
+  if value is None:
+    return None
+  if isinstance(value, datetime):
+    return time.mktime(value.timetuple())
+  return float(value)
+
+# yield entries of the given log file whose timestamp falls within [start, end]
+# and whose dataset id and name match dset and name, any of which may be None,
+# start and end may be datetime objects or seconds since the epoch
+def query(filename, start=None, end=None, dset=None, name=None, sparsefile=None, block_lines=1024):
+  blocks = update_sparse_index(filename, sparsefile, block_lines)
+  start = _query_seconds(start)
+  end   = _query_seconds(end)
+
+  # timestamps are monotonic for a single writer, but allow for a little
+  # disorder between writers by searching on the running max of each block's
+  # max timestamp and stopping on the running min of the remaining min timestamps
+  first = 0
+  if start is not None:
+    running_max = []
+    high = float('-inf')
+    for b in blocks:
+      if b[3] == b[3] and b[3] > high:
+        high = b[3]
+      running_max.append(high)
+    first = bisect.bisect_left(running_max, start)
+
+  remaining_min = [float('inf')] * (len(blocks) + 1)
+  for i in range(len(blocks) - 1, -1, -1):
+    low = blocks[i][2]
+    remaining_min[i] = low if low == low and low < remaining_min[i + 1] else remaining_min[i + 1]
+
+  # lines holding the requested name, to skip others without parsing them
+  quoted_name = None
+  if name is not None:
+    quoted_name = 'name="' + name + '"'
+
+  for i in range(first, len(blocks)):
+    offset, nlines, min_ts, max_ts, min_dset, max_dset = blocks[i]
+    if end is not None and remaining_min[i] > end:
+      break
+    if start is not None and max_ts == max_ts and max_ts < start:
+      continue
+    if end is not None and min_ts == min_ts and min_ts > end:
+      continue
+    if dset is not None and (min_dset == -1 or dset < min_dset or dset > max_dset):
+      continue
+
+    count = 0
+    for line_end, l in iter_offsets(filename, offset):
+      count += 1
+      if count > nlines:
+        break
+      if quoted_name is not None and quoted_name not in l:
+        continue
       e = parse_line(l)
+      if dset is not None and e.get('dset') != dset:
+        continue
+      if name is not None and e.get('name') != name:
+        continue
+      if start is not None or end is not None:
+        dt = e.get('timestamp')
+        if dt is None:
+          continue
+        ts = timestamp_seconds(dt)
+        if (start is not None and ts < start) or (end is not None and ts > end):
+          continue
+      yield e
+
+# inotify flags from <sys/inotify.h>
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+
+# start watching a file for changes with inotify, returns a non-blocking
+# file descriptor that becomes readable when the file changes,
+# or None if inotify is not available, e.g., on systems other than Linux
+def _inotify_watch(filename):
+  try:
+    import ctypes
+    import ctypes.util
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+  except (OSError, AttributeError):
+    return None
+  if fd < 0:
+    return None
+
+  path = filename.encode('utf-8') if _PY3 else filename
+  mask = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+  if libc.inotify_add_watch(fd, path, mask) < 0:
+    os.close(fd)
+    return None
+  return fd
+
+# wait until the inotify descriptor reports a change, or until timeout seconds
+# have passed, and discard any pending inotify events
+def _inotify_wait(fd, timeout):
+  if fd is None:
+    time.sleep(timeout)
+    return
+  readable, _, _ = select.select([fd], [], [], timeout)
+  if readable:
+    try:
+      while os.read(fd, 4096):
+        pass
+    except OSError:
+      pass
+
+# bytes read from the file at a time by follow(), only a trailing
+# partial line is held between reads
+follow_chunk = 1024 * 1024
+
+# given a file name, return a generator that yields one entry for each line
+# appended to the file, waiting for new lines indefinitely or until no new
+# lines have appeared for idle_timeout seconds, starting from the given byte
+# offset or from the end of the file at call time if offset is None, a trailing
+# line without a newline is held until the rest of it is written, and if the
+# file is truncated or replaced, e.g., by log rotation, reading resumes from
+# the start of the new file, the file is opened immediately, like iter_file(),
+# and with io.open() since python 2 file objects may not return data appended
+# after they reach the end
+def follow(filename, offset=None, labels=None, types=None, interval=0.5, idle_timeout=None):
+  f = io.open(filename, 'rb')
+  if offset is None:
+    offset = os.fstat(f.fileno()).st_size
+  f.seek(offset)
+  return _follow(f, filename, offset, labels, types, interval, idle_timeout)
+
+def _follow(f, filename, offset, labels, types, interval, idle_timeout):
+  watch = _inotify_watch(filename)
+
+  partial = b''
+  idle_since = time.time()
+  try:
+    while True:
+      data = f.read(follow_chunk)
+      if data:
+        idle_since = time.time()
+        lines = (partial + data).split(b'\n')
+        partial = lines.pop()
+        offset += len(data)
+        if _PY3:
+          lines = [l.decode('utf-8', 'replace') for l in lines]
+        for e in iter_lines(lines, labels=labels, types=types):
+          yield e
+        continue
+
+      # reopen the file from the start if it was replaced or truncated
+      try:
+        st = os.stat(filename)
+        replaced = (st.st_ino != os.fstat(f.fileno()).st_ino)
+      except OSError:
+        st = None
+        replaced = False
+      if replaced or (st is not None and st.st_size < offset):
+        f.close()
+        f = io.open(filename, 'rb')
+        offset = 0
+        partial = b''
+        if watch is not None:
+          os.close(watch)
+        watch = _inotify_watch(filename)
+        continue
+
+      if idle_timeout is not None and time.time() - idle_since >= idle_timeout:
+        return
+      _inotify_wait(watch, interval)
+  finally:
+    f.close()
+    if watch is not None:
+      os.close(watch)
+
+# bytes of a syslog file parsed by one task in iter_syslog()
+syslog_block = 16 * 1024 * 1024
+
+# given a block of complete lines from a syslog file, return a list of entries
+# for the SCR records among them, skipping lines whose label or type is not in
+# the labels or types collections before they are parsed
+def _syslog_entries(data, year, labels, types):
+  if _PY3:
+    data = data.decode('utf-8', 'replace')
+
+  entries = []
+  for l in data.splitlines():
+    if 'user=' not in l:
+      continue
+    if labels is not None or types is not None:
+      t, label = line_label(l)
+      if types is not None and t not in types:
+        continue
+      if labels is not None and label not in labels:
+        continue
+    e = parse_syslog_line(l, year)
+    if e is not None:
       entries.append(e)
   return entries
+
+# parse the lines of a plain syslog file that start within [start, end),
+# a line that crosses end belongs to this range, and a line that crosses
+# start belongs to the previous one
+def _syslog_range(task):
+  filename, start, end, year, labels, types = task
+  with open(filename, 'rb') as f:
+    if start > 0:
+      f.seek(start - 1)
+      f.readline()
+    pos = f.tell()
+    if pos >= end:
+      return []
+    data = f.read(end - pos)
+    if not data.endswith(b'\n'):
+      data += f.readline()
+  return _syslog_entries(data, year, labels, types)
+
+# parse a block of lines read from a compressed syslog file
+def _syslog_block(task):
+  data, year, labels, types = task
+  return _syslog_entries(data, year, labels, types)
+
+# return whether a file is compressed with gzip, from its first two bytes
+def is_gzip(filename):
+  with open(filename, 'rb') as f:
+    return f.read(2) == b'\x1f\x8b'
+
+# yield a (function, task) tuple for each block of a syslog file,
+# a plain file is split into byte ranges that the workers read themselves,
+# while a gzip file cannot be split without decompressing it, so its blocks
+# are decompressed here and cut after the last newline
+def _syslog_tasks(filename, year, labels, types):
+  if year is None:
+    year = time.localtime(os.stat(filename).st_mtime).tm_year
+
+  if not is_gzip(filename):
+    size = os.stat(filename).st_size
+    for start in range(0, size, syslog_block):
+      yield _syslog_range, (filename, start, min(start + syslog_block, size), year, labels, types)
+    return
+
+  import gzip
+  with gzip.open(filename, 'rb') as f:
+    partial = b''
+    while True:
+      data = f.read(syslog_block)
+      if not data:
+        break
+      data = partial + data
+      cut = data.rfind(b'\n') + 1
+      partial = data[cut:]
+      if cut > 0:
+        yield _syslog_block, (data[:cut], year, labels, types)
+    if partial:
+      yield _syslog_block, (partial, year, labels, types)
+
+# given a list of syslog files, plain or compressed with gzip, yield an entry
+# for each SCR record they hold, in the order of the files and of their lines,
+# the files are split into blocks on line boundaries that are parsed in a pool
+# of procs processes, with at most two blocks per process in flight at a time,
+# year gives the year for timestamps without one (default: year the file was
+# last modified), and labels and types filter records as in iter_lines()
+def iter_syslog(filenames, labels=None, types=None, procs=1, year=None):
+  if isinstance(filenames, str):
+    filenames = [filenames]
+  if labels is not None:
+    labels = frozenset(labels)
+  if types is not None:
+    types = frozenset(types)
+
+  tasks = (task for filename in filenames for task in _syslog_tasks(filename, year, labels, types))
+
+  if procs <= 1:
+    for func, task in tasks:
+      for e in func(task):
+        yield e
+    return
+
+  # multiprocessing rather than concurrent.futures, which python 2 lacks
+  import multiprocessing
+  from collections import deque
+  pool = multiprocessing.Pool(procs)
+  try:
+    pending = deque()
+    for func, task in tasks:
+      pending.append(pool.apply_async(func, (task,)))
+      if len(pending) >= 2 * procs:
+        for e in pending.popleft().get():
+          yield e
+    while pending:
+      for e in pending.popleft().get():
+        yield e
+  finally:
+    pool.terminate()
+    pool.join()
+
+# given a list of syslog files, return the SCR records they hold grouped by job,
+# as a dictionary that maps each prefix directory to a dictionary that maps each
+# resource manager jobid that used that prefix to the list of its entries in
+# time order, records whose syslog header has no recognizable timestamp are
+# skipped, since they cannot be placed in the history of their job
+def scan_syslog(filenames, labels=None, types=None, procs=1, year=None):
+  jobs = dict()
+  for e in iter_syslog(filenames, labels=labels, types=types, procs=procs, year=year):
+    if 'timestamp' in e:
+      jobs.setdefault(e.get('prefix'), dict()).setdefault(e.get('jobid'), []).append(e)
+
+  # rotated files may be listed in any order, so sort each run by time,
+  # the sort is stable and keeps records logged in the same second in order
+  for runs in jobs.values():
+    for entries in runs.values():
+      entries.sort(key=lambda e: e['timestamp'])
+  return jobs
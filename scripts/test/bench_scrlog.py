@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+# Measures lines per second of scrlog.parse_line() on a synthetic SCR log,
+# and of the regex cascade parser that it replaced, e.g.,
+#
+#   ./bench_scrlog.py --lines 10000000
+#
+# The regex parser used dateutil to parse timestamps, and it falls back
+# to datetime.strptime() when dateutil is not installed.
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testdir, '..', 'common'))
+
+import scrlog
+
+try:
+  from dateutil import parser as dateparser
+except ImportError:
+  dateparser = None
+
+# high resolution clock (python 3.3+)
+clock = getattr(time, 'perf_counter', time.time)
+
+# one checkpoint of a job, as written by scr_log_event and scr_log_transfer
+templates = [
+  'host={host}, jobid={jobid}, event=COMPUTE_END, secs=100.000000',
+  'host={host}, jobid={jobid}, event=CHECKPOINT_START, dset={dset}, name="ckpt.{dset}"',
+  'host={host}, jobid={jobid}, xfer=WRITE, from=/dev/shm, to=/dev/shm/user/scr.{jobid}/index.0/scr.dataset.{dset}, '
+    'dset={dset}, name="ckpt.{dset}", secs=3.000000, bytes=4000000.000000, files=4',
+  'host={host}, jobid={jobid}, xfer=FLUSH_SYNC, from=/dev/shm/user/scr.{jobid}/index.0/scr.dataset.{dset}, '
+    'to=/p/fs/job, dset={dset}, name="ckpt.{dset}", secs=6.000000, bytes=4000000.000000, files=4',
+  'host={host}, jobid={jobid}, event=CHECKPOINT_END, dset={dset}, name="ckpt.{dset}", secs=10.000000',
+  'host={host}, jobid={jobid}, event=COMPUTE_START, note="step 100, dt=0.01, restarted"',
+  'host={host}, jobid={jobid}, event=START, procs=4, nodes=1',
+]
+
+# write a log of the given number of lines, one second apart
+def write_log(path, lines):
+  start = datetime(2020, 1, 1)
+  with open(path, 'w') as f:
+    for i in range(lines):
+      ts = (start + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%S')
+      line = templates[i % len(templates)].format(host='node%d' % (i % 16), jobid=1000 + i // 7000, dset=i // 7)
+      f.write(ts + ': ' + line + '\n')
+
+# the regex cascade that parse_line() replaced
+re_time  = re.compile(r'^(\d\d\d\d\-\d\d\-\d\dT\d\d:\d\d:\d\d)')
+re_jobid = re.compile(r'^jobid=(.*)$')
+re_event = re.compile(r'^event=(.*)$')
+re_xfer  = re.compile(r'^xfer=(.*)$')
+re_from  = re.compile(r'^from=(.*)$')
+re_to    = re.compile(r'^to=(.*)$')
+re_secs  = re.compile(r'^secs=(\d+\.\d+)$')
+re_dset  = re.compile(r'^dset=(\d+)$')
+re_bytes = re.compile(r'^bytes=(\d+\.\d+)$')
+re_files = re.compile(r'^files=(\d+)$')
+re_name  = re.compile(r'.* name=\"(.*?)\"')
+re_note  = re.compile(r'.* note=\"(.*?)\"')
+
+def parse_line_regex(l):
+  e = dict()
+  for p in l.split(", "):
+    m = re_jobid.match(p)
+    if m:
+      e['jobid'] = m.group(1)
+      continue
+    m = re_event.match(p)
+    if m:
+      e['type'] = 'event'
+      e['label'] = m.group(1)
+      continue
+    m = re_xfer.match(p)
+    if m:
+      e['type'] = 'xfer'
+      e['label'] = m.group(1)
+      continue
+    m = re_from.match(p)
+    if m:
+      e['from'] = m.group(1)
+      continue
+    m = re_to.match(p)
+    if m:
+      e['to'] = m.group(1)
+      continue
+    m = re_dset.match(p)
+    if m:
+      e['dset'] = int(m.group(1))
+      continue
+    m = re_secs.match(p)
+    if m:
+      e['secs'] = float(m.group(1))
+      continue
+    m = re_bytes.match(p)
+    if m:
+      e['bytes'] = float(m.group(1))
+      continue
+    m = re_files.match(p)
+    if m:
+      e['files'] = float(m.group(1))
+      continue
+
+  m = re_time.match(l)
+  if m:
+    if dateparser is not None:
+      e['timestamp'] = dateparser.parse(m.group(1))
+    else:
+      e['timestamp'] = datetime.strptime(m.group(1), '%Y-%m-%dT%H:%M:%S')
+  m = re_note.match(l)
+  if m:
+    e['note'] = m.group(1)
+  m = re_name.match(l)
+  if m:
+    e['name'] = m.group(1)
+  return e
+
+# return seconds to parse each line of a file
+def time_parser(path, parse):
+  start = clock()
+  with open(path, 'r') as f:
+    for l in f:
+      parse(l)
+  return clock() - start
+
+argparser = argparse.ArgumentParser(
+  description="Measure lines per second of scrlog.parse_line() and of the regex parser it replaced.",
+  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+argparser.add_argument('--lines', help='number of lines in the synthetic log', type=int, default=1000000)
+argparser.add_argument('--log', help='parse this log file rather than a synthetic one', default=None)
+args = argparser.parse_args()
+
+tmpdir = None
+path = args.log
+if path is None:
+  tmpdir = tempfile.mkdtemp()
+  path = os.path.join(tmpdir, 'log')
+  write_log(path, args.lines)
+
+try:
+  with open(path, 'r') as f:
+    lines = sum(1 for l in f)
+
+  # warm the page cache
+  time_parser(path, len)
+
+  before = time_parser(path, parse_line_regex)
+  after = time_parser(path, scrlog.parse_line)
+finally:
+  if tmpdir is not None:
+    shutil.rmtree(tmpdir)
+
+print("lines=%d timestamps=%s" % (lines, 'dateutil' if dateparser is not None else 'strptime'))
+print("regex cascade: %10.0f lines/sec" % (lines / before))
+print("parse_line:    %10.0f lines/sec" % (lines / after))
+print("speedup:       %10.2fx" % (before / after))
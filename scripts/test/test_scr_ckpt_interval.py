@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+# Runs some tests on scr_ckpt_interval.py functions against the
+# small log files in logs/ to verify that they produce the expected output.
+# Exits with 0 if successful, 1 otherwise.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+try:
+  from StringIO import StringIO
+except ImportError:
+  from io import StringIO
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+logdir = os.path.join(testdir, 'logs')
+sys.path.insert(0, os.path.join(testdir, '..', 'common'))
+
+import scr_ckpt_state
+import scr_ckpt_interval
+
+# return the lines of a log file in logs/
+def read_lines(name):
+  with open(os.path.join(logdir, name)) as f:
+    return f.readlines()
+
+class StateFileTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.logfile = os.path.join(self.tmpdir, 'log')
+    self.statefile = os.path.join(self.tmpdir, 'ckpt_interval.json')
+    self.lines = read_lines('ckpt_interval.log')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, lines, mode='w'):
+    with open(self.logfile, mode) as f:
+      f.writelines(lines)
+
+  def scan(self, rescan=False):
+    return scr_ckpt_interval.scan_log(self.logfile, statefile=self.statefile, rescan=rescan)
+
+  # totals from parsing the whole log from the start
+  def full_scan(self):
+    return scr_ckpt_interval.scan_log(self.logfile, statefile=os.path.join(self.tmpdir, 'full.json'), rescan=True)
+
+  def test_missing_log(self):
+    self.assertIsNone(self.scan())
+
+  def test_append(self):
+    # scan the log in three pieces, the second ends in a partial line
+    split1 = len(self.lines) // 3
+    split2 = 2 * len(self.lines) // 3
+    self.write(self.lines[:split1])
+    self.scan()
+
+    partial = self.lines[split2][:20]
+    self.write(self.lines[split1:split2] + [partial], mode='a')
+    totals = self.scan()
+    self.assertEqual(totals['num_starts'], 2.0)
+
+    self.write([self.lines[split2][20:]] + self.lines[split2 + 1:], mode='a')
+    self.assertEqual(self.scan(), self.full_scan())
+    self.assertEqual(self.scan()['num_starts'], 3.0)
+    self.assertEqual(self.scan()['checkpoint_count'], 6.0)
+
+  def test_truncate(self):
+    self.write(self.lines)
+    self.scan()
+
+    # a shorter log at the same inode must be parsed from the start
+    self.write(self.lines[:10])
+    totals = self.scan()
+    self.assertEqual(totals, self.full_scan())
+    self.assertEqual(totals['num_starts'], 1.0)
+
+  def test_rotate(self):
+    self.write(self.lines)
+    self.scan()
+
+    # a new log file at least as large at the same path must be parsed from the start
+    size = os.path.getsize(self.logfile)
+    os.rename(self.logfile, self.logfile + '.1')
+    copies = 0
+    while not os.path.exists(self.logfile) or os.path.getsize(self.logfile) < size:
+      self.write(self.lines[:10], mode='a')
+      copies += 1
+    totals = self.scan()
+    self.assertEqual(totals, self.full_scan())
+    self.assertEqual(totals['num_starts'], float(copies))
+
+  def test_stale_version(self):
+    self.write(self.lines)
+    self.scan()
+
+    # state saved by another version of the script is ignored
+    st = os.stat(self.logfile)
+    totals = scr_ckpt_interval.new_totals()
+    totals['num_starts'] = 100.0
+    saved_version = scr_ckpt_interval.STATE_VERSION
+    scr_ckpt_interval.STATE_VERSION = saved_version - 1
+    try:
+      scr_ckpt_interval.save_state(self.statefile, st, totals, st.st_size)
+    finally:
+      scr_ckpt_interval.STATE_VERSION = saved_version
+    self.assertIsNone(scr_ckpt_state.read_state(self.statefile))
+    self.assertEqual(self.scan()['num_starts'], 3.0)
+    self.assertEqual(scr_ckpt_state.read_state(self.statefile)['totals']['num_starts'], 3.0)
+
+  def test_merge(self):
+    self.write(self.lines)
+    totals = self.scan()
+    merged = scr_ckpt_interval.merge_totals([totals, totals])
+    self.assertEqual(merged['num_starts'], 2 * totals['num_starts'])
+    self.assertEqual(merged['checkpoint_secs'], 2 * totals['checkpoint_secs'])
+    self.assertEqual(merged['async_active'], dict())
+
+# return costs computed from the totals of a log file in logs/
+def log_costs(name, lines=None):
+  totals = scr_ckpt_interval.new_totals()
+  for l in (lines if lines is not None else read_lines(name)):
+    e = scr_ckpt_interval.scrlog.parse_line(l)
+    if e.get('label') in scr_ckpt_interval.labels:
+      scr_ckpt_interval.accumulate(totals, e)
+  return scr_ckpt_interval.compute_costs(totals)
+
+class MultilevelTest(unittest.TestCase):
+  def setUp(self):
+    self.flush = os.environ.pop('SCR_FLUSH', None)
+
+  def tearDown(self):
+    if self.flush is not None:
+      os.environ['SCR_FLUSH'] = self.flush
+    else:
+      os.environ.pop('SCR_FLUSH', None)
+
+  def test_first_run(self):
+    # the first start of a job is not a failure, so there is nothing to model,
+    # and the model must recommend flushing every checkpoint
+    c = log_costs('first_run.log')
+    self.assertEqual(c['level1_failures'], 0.0)
+    self.assertEqual(c['level2_failures'], 0.0)
+    self.assertGreater(c['level2_cost'], 0.0)
+    secs, overhead, flush = scr_ckpt_interval.optimum_interval(c, 'multilevel')
+    self.assertEqual(flush, 1)
+
+  def test_no_fetch(self):
+    # a restart from cache but no fetch yet limits checkpoints per flush
+    lines = [l for l in read_lines('ckpt_interval.log') if 'jobid=1003' not in l]
+    c = log_costs(None, lines)
+    self.assertEqual(c['level1_failures'], 1.0)
+    self.assertEqual(c['level2_failures'], 0.0)
+    secs, overhead, flush = scr_ckpt_interval.optimum_interval(c, 'multilevel')
+    self.assertLessEqual(flush, scr_ckpt_interval.max_flush_unobserved)
+
+    os.environ['SCR_FLUSH'] = '3'
+    secs, overhead, flush = scr_ckpt_interval.optimum_interval(c, 'multilevel')
+    self.assertLessEqual(flush, 3)
+
+  def test_fetch(self):
+    # one restart from cache and one fetch over three runs
+    c = log_costs('ckpt_interval.log')
+    self.assertEqual(c['level1_failures'], 1.0)
+    self.assertEqual(c['level2_failures'], 1.0)
+    secs, overhead, flush = scr_ckpt_interval.optimum_interval(c, 'multilevel')
+    self.assertGreater(secs, 0.0)
+    self.assertGreaterEqual(flush, 1)
+
+class AsyncFlushTest(unittest.TestCase):
+  def accumulate(self, lines, totals=None):
+    if totals is None:
+      totals = scr_ckpt_interval.new_totals()
+    for l in lines:
+      e = scr_ckpt_interval.scrlog.parse_line(l)
+      if e.get('label') in scr_ckpt_interval.labels:
+        scr_ckpt_interval.accumulate(totals, e)
+    return totals
+
+  def test_unmatched_start(self):
+    # the first job is killed while flushing ckpt.2, the next START forgets it
+    totals = self.accumulate(read_lines('stale_async.log'))
+    self.assertEqual(totals['async_active'], dict())
+    self.assertEqual(totals['async_phases'], list())
+    self.assertEqual(totals['async_flush_count'], 4.0)
+    self.assertEqual(totals['async_hidden_secs'], 120.0)
+
+  def test_unmatched_start_many_checkpoints(self):
+    # without a START after the unmatched flush, the next completed flush forgets it,
+    # so the phases kept while waiting stay few over many checkpoints
+    lines = read_lines('stale_async.log')
+    start = [i for i, l in enumerate(lines) if 'event=START' in l][1]
+    killed, cycle = lines[:start], lines[start + 1:start + 10]
+    totals = self.accumulate(killed)
+    self.assertEqual(len(totals['async_active']), 1)
+    for i in range(2000):
+      self.accumulate(cycle, totals)
+      self.assertLessEqual(len(totals['async_phases']), 2)
+    self.assertEqual(totals['async_active'], dict())
+
+  def test_cap(self):
+    # a flush that never ends and is never followed by another one
+    # keeps a bounded number of phases
+    lines = read_lines('stale_async.log')
+    start = [i for i, l in enumerate(lines) if 'event=START' in l][1]
+    compute = [l for l in lines[start:] if 'COMPUTE' in l][:2]
+    totals = self.accumulate(lines[:start])
+    for i in range(2 * scr_ckpt_interval.max_async_phases):
+      self.accumulate(compute, totals)
+    self.assertEqual(len(totals['async_phases']), scr_ckpt_interval.max_async_phases)
+
+class FleetTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.stdout = sys.stdout
+    sys.stdout = StringIO()
+
+  def tearDown(self):
+    sys.stdout = self.stdout
+    shutil.rmtree(self.tmpdir)
+
+  def test_no_checkpoint(self):
+    # a log without a completed checkpoint has no interval, but must not
+    # stop the report for the other logs and the groups
+    results = dict()
+    names = dict()
+    for name in ('no_checkpoint.log', 'ckpt_interval.log'):
+      logfile = os.path.join(logdir, name)
+      results[logfile] = scr_ckpt_interval.scan_log(logfile, statefile=os.path.join(self.tmpdir, name + '.json'))
+      names[logfile] = name
+    for model in ('young', 'daly', 'multilevel'):
+      c = scr_ckpt_interval.compute_costs(results[os.path.join(logdir, 'no_checkpoint.log')])
+      self.assertIsNone(scr_ckpt_interval.optimum_interval(c, model))
+      scr_ckpt_interval.print_fleet_stats(results, names, model, 'Log')
+    lines = sys.stdout.getvalue().splitlines()
+    self.assertEqual(len([l for l in lines if 'no_checkpoint.log' in l and 'interval=n/a' in l]), 6)
+    self.assertEqual(len([l for l in lines if l.startswith('Job ALL') and 'interval=n/a' not in l]), 3)
+
+  def test_fleet_state(self):
+    # a fleet report writes nothing next to the logs,
+    # and only saves totals to the directory given for them
+    filenames = []
+    for name in ('run1', 'run2'):
+      scrdir = os.path.join(self.tmpdir, name, '.scr')
+      os.makedirs(scrdir)
+      shutil.copy(os.path.join(logdir, 'ckpt_interval.log'), os.path.join(scrdir, 'log'))
+      filenames.append(os.path.join(scrdir, 'log'))
+
+    scr_ckpt_interval.fleet_stats(filenames, 'daly', 2, False)
+    report = sys.stdout.getvalue()
+    self.assertTrue(report)
+    for filename in filenames:
+      self.assertEqual(os.listdir(os.path.dirname(filename)), ['log'])
+
+    statedir = os.path.join(self.tmpdir, 'state')
+    for i in range(2):
+      sys.stdout = StringIO()
+      scr_ckpt_interval.fleet_stats(filenames, 'daly', 2, False, statedir=statedir)
+      self.assertEqual(sys.stdout.getvalue(), report)
+      self.assertEqual(sorted(os.listdir(statedir)),
+                       sorted(os.path.basename(scr_ckpt_interval.fleet_statefile(statedir, f)) for f in filenames))
+    for filename in filenames:
+      self.assertEqual(os.listdir(os.path.dirname(filename)), ['log'])
+
+  def test_syslog_no_checkpoint(self):
+    syslog = os.path.join(self.tmpdir, 'messages')
+    with open(syslog, 'w') as f:
+      for l in read_lines('no_checkpoint.log'):
+        ts, rest = l.split(': ', 1)
+        rest = rest.replace('host=node1, ', '').replace('jobid=3001, ', 'user=user1, jobid=3001, prefix=/p/fs/job, ')
+        f.write('%s node1 scr[100]: %s' % (ts, rest))
+    scr_ckpt_interval.syslog_stats([syslog], 'daly', 1)
+    lines = sys.stdout.getvalue().splitlines()
+    self.assertTrue(lines[0].startswith('Prefix /p/fs/job: starts=1 '))
+    self.assertTrue(lines[0].endswith('interval=n/a overhead=n/a'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+# Runs some tests on scr_log_metrics.py functions against the small
+# log files in logs/ to verify that they produce the expected output.
+# Exits with 0 if successful, 1 otherwise.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+logdir = os.path.join(testdir, 'logs')
+sys.path.insert(0, os.path.join(testdir, '..', 'common'))
+
+import scrlog
+import scr_log_metrics
+
+# return the lines of a log file in logs/
+def read_lines(name):
+  with open(os.path.join(logdir, name)) as f:
+    return f.readlines()
+
+class AccumulateTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.logfile = os.path.join(self.tmpdir, 'log')
+    self.lines = read_lines('ckpt_interval.log')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def metrics(self, lines):
+    m = scr_log_metrics.new_metrics()
+    for l in lines:
+      scr_log_metrics.accumulate(m, scrlog.parse_line(l))
+    return m
+
+  def test_untyped_lines(self):
+    # blank lines and lines without event= or xfer= are skipped
+    noise = ['\n', 'garbage\n', '2020-01-01T00:00:00: host=node1, jobid=1001\n']
+    self.assertEqual(self.metrics(noise), scr_log_metrics.new_metrics())
+    self.assertEqual(self.metrics(noise + self.lines), self.metrics(self.lines))
+
+  def test_update(self):
+    with open(self.logfile, 'w') as f:
+      f.write('\n')
+      f.writelines(self.lines)
+      f.write('not a record\n')
+    lm = scr_log_metrics.LogMetrics(self.logfile, statefile=os.path.join(self.tmpdir, 'state.json'))
+    self.assertTrue(lm.update())
+    self.assertEqual(lm.metrics, self.metrics(self.lines))
+    self.assertEqual(lm.metrics['events']['START'], 3)
+
+if __name__ == '__main__':
+  unittest.main()
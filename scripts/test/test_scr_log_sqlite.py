@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# Runs some tests on scr_log_sqlite.py functions against the small
+# log files in logs/ to verify that they produce the expected output.
+# Exits with 0 if successful, 1 otherwise.
+
+import os
+import sys
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+logdir = os.path.join(testdir, 'logs')
+sys.path.insert(0, os.path.join(testdir, '..', 'common'))
+
+import scrlog
+import scr_log_sqlite
+
+# return the lines of a log file in logs/
+def read_lines(name):
+  with open(os.path.join(logdir, name)) as f:
+    return f.readlines()
+
+class LoadTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.logfile = os.path.join(self.tmpdir, 'log')
+    self.db = scr_log_sqlite.connect(os.path.join(self.tmpdir, 'scr.db'))
+    self.lookups = scr_log_sqlite.Lookups(self.db)
+
+  def tearDown(self):
+    self.db.close()
+    shutil.rmtree(self.tmpdir)
+
+  def test_bandwidth(self):
+    # bandwidth is bytes over seconds, and 0 for a transfer that took no time
+    lines = read_lines('ckpt_interval.log')
+    lines.append('2020-01-01T05:00:00: host=node1, jobid=1003, xfer=WRITE, from=/dev/shm, '
+                 'to=/dev/shm/scr.dataset.9, dset=9, name="ckpt.9", secs=0.000000, '
+                 'bytes=100.000000, files=1\n')
+    with open(self.logfile, 'w') as f:
+      f.writelines(lines)
+    self.assertEqual(scr_log_sqlite.load_log(self.db, self.lookups, self.logfile), len(lines))
+
+    expected = [(e['secs'], e['bytes'], e['bytes'] / e['secs'] if e['secs'] > 0.0 else 0.0)
+                for e in scrlog.iter_lines(lines) if e['type'] == 'xfer']
+    rows = self.db.execute('SELECT secs, bytes, bw FROM transfers ORDER BY id').fetchall()
+    self.assertEqual(len(rows), len(expected))
+    for row, x in zip(rows, expected):
+      for found, value in zip(row, x):
+        self.assertIsInstance(found, float)
+        self.assertAlmostEqual(found, value)
+    self.assertEqual(rows[-1], (0.0, 100.0, 0.0))
+
+  # number of records that refer to a row missing from another table
+  def dangling(self):
+    count = 0
+    for table in ('transfers', 'events'):
+      for column, parent in (('job_id', 'jobs'), ('type_id', 'types'), ('host_id', 'hosts')):
+        count += self.db.execute('SELECT count(*) FROM %s WHERE %s NOT IN (SELECT id FROM %s)' %
+                                 (table, column, parent)).fetchone()[0]
+    return count
+
+  def test_rollback(self):
+    # a load that fails after adding a new host, job, and type leaves
+    # no ids of the rolled back rows behind for the next load to use
+    lines = [l.replace('host=node1', 'host=node9').replace('FLUSH_SYNC', 'FLUSH_NEW')
+             for l in read_lines('ckpt_interval.log')]
+    with open(self.logfile, 'w') as f:
+      f.writelines(lines)
+
+    insert_records = scr_log_sqlite.insert_records
+    def failing_insert(*args):
+      insert_records(*args)
+      raise sqlite3.OperationalError('disk I/O error')
+    scr_log_sqlite.insert_records = failing_insert
+    try:
+      self.assertRaises(sqlite3.OperationalError, scr_log_sqlite.load_log, self.db, self.lookups, self.logfile)
+    finally:
+      scr_log_sqlite.insert_records = insert_records
+
+    self.assertEqual(scr_log_sqlite.load_log(self.db, self.lookups, self.logfile), len(lines))
+    self.assertEqual(self.dangling(), 0)
+    self.assertEqual(self.db.execute("SELECT count(*) FROM hosts WHERE name = 'node9'").fetchone()[0], 1)
+
+  def test_gzip(self):
+    # a compressed syslog file loads the same records as the plain file, once
+    syslog = os.path.join(logdir, 'syslog.log')
+    compressed = os.path.join(self.tmpdir, 'messages.1.gz')
+    with open(syslog, 'rb') as f:
+      data = f.read()
+    with gzip.open(compressed, 'wb') as f:
+      f.write(data)
+
+    count = scr_log_sqlite.load_log(self.db, self.lookups, syslog, syslog=True)
+    self.assertEqual(count, 2 * len(read_lines('ckpt_interval.log')))
+    self.assertEqual(scr_log_sqlite.load_log(self.db, self.lookups, compressed, syslog=True), count)
+    self.assertEqual(scr_log_sqlite.load_log(self.db, self.lookups, compressed, syslog=True), 0)
+    self.assertEqual(self.dangling(), 0)
+
+    # compare the rows loaded from each file
+    logs = dict(self.db.execute('SELECT path, id FROM logs'))
+    query = ('SELECT job_id, type_id, dset_id, start, secs, bytes, bw, host_id, jobid FROM transfers '
+             'WHERE log_id = ? ORDER BY id')
+    rows = self.db.execute(query, (logs[syslog],)).fetchall()
+    self.assertTrue(rows)
+    self.assertEqual(self.db.execute(query, (logs[compressed],)).fetchall(), rows)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+# Runs some tests on scr_log_trace.py functions against the small
+# log files in logs/ to verify that they produce the expected output.
+# Exits with 0 if successful, 1 otherwise.
+
+import os
+import sys
+import json
+import unittest
+
+try:
+  from StringIO import StringIO
+except ImportError:
+  from io import StringIO
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+logdir = os.path.join(testdir, 'logs')
+sys.path.insert(0, os.path.join(testdir, '..', 'common'))
+
+import scrlog
+import scr_log_trace
+
+# return the lines of a log file in logs/
+def read_lines(name):
+  with open(os.path.join(logdir, name)) as f:
+    return f.readlines()
+
+# return the trace events written for a list of lines
+def trace(lines):
+  f = StringIO()
+  t = scr_log_trace.TraceWriter(f)
+  for e in scrlog.iter_lines(lines):
+    t.add(e)
+  t.close()
+  return json.loads(f.getvalue())['traceEvents']
+
+class TraceTest(unittest.TestCase):
+  def test_untyped_lines(self):
+    # blank lines and lines without event= or xfer= are skipped
+    lines = read_lines('ckpt_interval.log')
+    noise = ['\n', 'garbage\n', '2020-01-01T00:00:00: host=node1, jobid=1001\n']
+    self.assertEqual(trace(noise), [])
+    self.assertEqual(trace(noise + lines), trace(lines))
+
+  def test_transfer_tracks(self):
+    # transfers are drawn on the track of the storage level they write to
+    events = trace(read_lines('ckpt_interval.log'))
+    names = dict(((x['pid'], x['tid']), x['args']['name']) for x in events if x['name'] == 'thread_name')
+    for x in events:
+      if x['ph'] == 'X' and 'bw' in x['args']:
+        track = names[(x['pid'], x['tid'])].split(' #')[0]
+        self.assertEqual(track, '/dev/shm' if x['name'] in scrlog.cache_types else 'prefix')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+
+# Runs some tests on scrlog.py functions against the small log files
+# in logs/ to verify that they produce the expected output.
+# Exits with 0 if successful, 1 otherwise.
+
+import os
+import sys
+import gzip
+import math
+import shutil
+import calendar
+import tempfile
+import unittest
+from array import array
+from datetime import datetime
+
+testdir = os.path.dirname(os.path.abspath(__file__))
+logdir = os.path.join(testdir, 'logs')
+sys.path.insert(0, os.path.join(testdir, '..', 'common'))
+
+import scrlog
+
+# return the lines of a log file in logs/
+def read_lines(name):
+  with open(os.path.join(logdir, name)) as f:
+    return f.readlines()
+
+# copy of an entry without the byte offset that index entries add
+def without_offset(e):
+  e = dict(e)
+  e.pop('offset', None)
+  return e
+
+class LogTest(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.logfile = os.path.join(self.tmpdir, 'log')
+    self.lines = read_lines('ckpt_interval.log')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def write(self, lines, mode='w'):
+    with open(self.logfile, mode) as f:
+      f.writelines(lines)
+
+class SidecarIndexTest(LogTest):
+  def check_index(self):
+    with scrlog.open_index(self.logfile) as idx:
+      entries = [without_offset(e) for e in idx]
+      offsets = [e['offset'] for e in idx]
+    self.assertEqual(entries, scrlog.parse_file(self.logfile))
+
+    # each offset points at the line the entry came from
+    with open(self.logfile, 'rb') as f:
+      data = f.read()
+    for offset, l in zip(offsets, self.lines):
+      self.assertEqual(data[offset:offset + len(l)].decode('utf-8'), l)
+
+  def test_full_scan(self):
+    self.write(self.lines)
+    self.check_index()
+
+  def test_append(self):
+    half = len(self.lines) // 2
+    self.write(self.lines[:half])
+    self.check_index()
+    self.write(self.lines[half:], mode='a')
+    self.check_index()
+
+  def test_truncate(self):
+    self.write(self.lines)
+    self.check_index()
+    self.lines = self.lines[:5]
+    self.write(self.lines)
+    self.check_index()
+
+class SparseIndexTest(LogTest):
+  # compare query() against filtering a full scan, with small blocks
+  # so that the log spans many of them
+  def check_query(self, **kwargs):
+    entries = scrlog.parse_file(self.logfile)
+    start = kwargs.get('start')
+    end = kwargs.get('end')
+    expected = [e for e in entries
+                if (start is None or e['timestamp'] >= start) and
+                   (end is None or e['timestamp'] <= end) and
+                   ('dset' not in kwargs or e.get('dset') == kwargs['dset']) and
+                   ('name' not in kwargs or e.get('name') == kwargs['name'])]
+    found = list(scrlog.query(self.logfile, block_lines=4, **kwargs))
+    self.assertEqual(found, expected)
+    return found
+
+  def check_all(self):
+    entries = scrlog.parse_file(self.logfile)
+    times = sorted(set(e['timestamp'] for e in entries))
+    self.assertEqual(self.check_query(), entries)
+    self.assertTrue(self.check_query(start=times[len(times) // 3], end=times[2 * len(times) // 3]))
+    self.assertTrue(self.check_query(start=times[-1]))
+    self.assertTrue(self.check_query(end=times[0]))
+    self.assertTrue(self.check_query(dset=1))
+    for dset in (4, 6):
+      self.check_query(dset=dset)
+    self.assertEqual(self.check_query(dset=99), [])
+    self.check_query(name='ckpt.3')
+    self.check_query(dset=4, start=times[len(times) // 2])
+
+  def test_full_scan(self):
+    self.write(self.lines)
+    self.check_all()
+    self.assertTrue(self.check_query(dset=6))
+    self.assertTrue(self.check_query(name='ckpt.3'))
+
+  def test_append(self):
+    half = len(self.lines) // 2 + 1
+    self.write(self.lines[:half])
+    self.check_all()
+    self.write(self.lines[half:], mode='a')
+    self.check_all()
+
+  def test_truncate(self):
+    self.write(self.lines)
+    self.check_all()
+    self.write(self.lines[:20])
+    self.check_query(dset=1)
+    self.check_query(dset=6)
+
+class ParseLineTest(unittest.TestCase):
+  def test_transfer(self):
+    e = scrlog.parse_line('2020-01-01T00:01:44: host=node1, jobid=1001, xfer=FLUSH_SYNC, '
+                          'from=/dev/shm/scr.dataset.1, to=/p/fs/job, dset=1, name="ckpt.1", '
+                          'secs=6.000000, bytes=4000000.000000, files=4\n')
+    self.assertEqual(e['type'], 'xfer')
+    self.assertEqual(e['label'], 'FLUSH_SYNC')
+    self.assertEqual(e['host'], 'node1')
+    self.assertEqual(e['jobid'], '1001')
+    self.assertEqual(e['from'], '/dev/shm/scr.dataset.1')
+    self.assertEqual(e['to'], '/p/fs/job')
+    self.assertEqual(e['dset'], 1)
+    self.assertEqual(e['name'], 'ckpt.1')
+    self.assertEqual(e['secs'], 6.0)
+    self.assertEqual(e['bytes'], 4000000.0)
+    self.assertEqual(e['files'], 4.0)
+
+  def test_quoted_separator(self):
+    # quoted values may hold the ", " separator
+    e = scrlog.parse_line('2020-01-01T00:00:00: host=node1, jobid=1, event=CHECKPOINT_END, '
+                          'note="a, b", dset=2, name="x, y, z", secs=1.5')
+    self.assertEqual(e['note'], 'a, b')
+    self.assertEqual(e['name'], 'x, y, z')
+    self.assertEqual(e['dset'], 2)
+    self.assertEqual(e['secs'], 1.5)
+
+  def test_malformed(self):
+    # malformed values are skipped, and lines without a record have no type
+    e = scrlog.parse_line('2020-01-01T00:00:00: host=node1, event=START, procs=x, nodes=2')
+    self.assertNotIn('procs', e)
+    self.assertEqual(e['nodes'], 2)
+    self.assertNotIn('type', scrlog.parse_line('\n'))
+
+  def test_file(self):
+    entries = scrlog.parse_file(os.path.join(logdir, 'ckpt_interval.log'))
+    self.assertEqual(len(entries), len(read_lines('ckpt_interval.log')))
+    self.assertEqual(entries, list(scrlog.iter_lines(read_lines('ckpt_interval.log'))))
+
+class ColumnsTest(LogTest):
+  # decode the columns back into fields and compare them with parse_file()
+  def check_columns(self, numpy, **kwargs):
+    cols = scrlog.parse_columns(self.logfile, numpy=numpy, **kwargs)
+    entries = scrlog.parse_file(self.logfile, **kwargs)
+    self.assertEqual(cols['count'], len(entries))
+
+    names = cols['names']
+    for field in scrlog.category_columns:
+      # each distinct value is stored once
+      self.assertEqual(len(set(names[field])), len(names[field]))
+      self.assertEqual(len(cols[field]), len(entries))
+
+    for i, e in enumerate(entries):
+      self.assertEqual(cols['timestamp'][i], scrlog.timestamp_seconds(e['timestamp']))
+      for field, typecode, missing in scrlog.numeric_columns:
+        value = cols[field][i]
+        if field in e:
+          self.assertEqual(value, e[field])
+        elif typecode == 'd':
+          self.assertTrue(math.isnan(value))
+        else:
+          self.assertEqual(value, missing)
+      for field in scrlog.category_columns:
+        self.assertEqual(names[field][cols[field][i]], e.get(field))
+    return cols
+
+  def check_all(self, numpy):
+    self.write(self.lines)
+    cols = self.check_columns(numpy)
+    self.check_columns(numpy, labels=['CHECKPOINT_END', 'FLUSH_SYNC'])
+    self.check_columns(numpy, types=['xfer'])
+    self.assertEqual(self.check_columns(numpy, labels=['NO_SUCH_EVENT'])['count'], 0)
+    return cols
+
+  def test_arrays(self):
+    cols = self.check_all(False)
+    for field in ['timestamp'] + scrlog.category_columns:
+      self.assertIsInstance(cols[field], array)
+
+  def test_numpy(self):
+    try:
+      import numpy as np
+    except ImportError:
+      self.skipTest('numpy is not available')
+    cols = self.check_all(True)
+    for field in ['timestamp'] + scrlog.category_columns:
+      self.assertIsInstance(cols[field], np.ndarray)
+
+  def test_empty(self):
+    self.write([])
+    cols = scrlog.parse_columns(self.logfile, numpy=False)
+    self.assertEqual(cols['count'], 0)
+    self.assertEqual(len(cols['timestamp']), 0)
+
+class FollowTest(LogTest):
+  def setUp(self):
+    LogTest.setUp(self)
+    self.chunk = scrlog.follow_chunk
+
+  def tearDown(self):
+    scrlog.follow_chunk = self.chunk
+    LogTest.tearDown(self)
+
+  def take(self, g, count):
+    return [next(g) for i in range(count)]
+
+  def check(self, chunk):
+    # read in chunks smaller than a line, so lines span several reads
+    scrlog.follow_chunk = chunk
+    lines = self.lines
+    self.write(lines[:5] + [lines[5][:30]])
+    g = scrlog.follow(self.logfile, offset=0, interval=0.01, idle_timeout=0.2)
+    self.assertEqual(self.take(g, 5), list(scrlog.iter_lines(lines[:5])))
+
+    # the rest of the partial line is appended
+    self.write([lines[5][30:]] + lines[6:10], mode='a')
+    self.assertEqual(self.take(g, 5), list(scrlog.iter_lines(lines[5:10])))
+
+    # truncated in place
+    self.write(lines[:3])
+    self.assertEqual(self.take(g, 3), list(scrlog.iter_lines(lines[:3])))
+
+    # rotated, and replaced by a larger file
+    os.rename(self.logfile, self.logfile + '.1')
+    self.write(lines[:12])
+    self.assertEqual(self.take(g, 12), list(scrlog.iter_lines(lines[:12])))
+
+    # nothing more is written, so it stops after idle_timeout
+    self.assertEqual(list(g), [])
+
+  def test_follow(self):
+    self.check(self.chunk)
+
+  def test_small_chunks(self):
+    self.check(16)
+
+  def test_offset(self):
+    # by default, only lines appended after the call are returned
+    self.write(self.lines[:5])
+    g = scrlog.follow(self.logfile, interval=0.01, idle_timeout=0.2)
+    self.write(self.lines[5:7], mode='a')
+    self.assertEqual(list(g), list(scrlog.iter_lines(self.lines[5:7])))
+
+class SyslogLineTest(unittest.TestCase):
+  record = 'user=user1, jobid=1001, prefix=/p/fs/job, event=START, procs=4, nodes=1'
+
+  # seconds since the epoch of a UTC time
+  def utc(self, *args):
+    return float(calendar.timegm(datetime(*args).timetuple()))
+
+  def check(self, header, host='node1'):
+    e = scrlog.parse_syslog_line(header + self.record + '\n', 2020)
+    self.assertEqual(e['type'], 'event')
+    self.assertEqual(e['label'], 'START')
+    self.assertEqual(e['user'], 'user1')
+    self.assertEqual(e['jobid'], '1001')
+    self.assertEqual(e['prefix'], '/p/fs/job')
+    self.assertEqual(e['procs'], 4)
+    self.assertEqual(e['host'], host)
+    return e
+
+  def test_rfc5424(self):
+    e = self.check('<13>1 2020-01-01T02:00:00.123456+02:00 node1 scr 100 - - ')
+    self.assertEqual(scrlog.timestamp_seconds(e['timestamp']), self.utc(2020, 1, 1, 0, 0, 0))
+    e = self.check('<13>1 2020-01-01T00:00:00Z node1 scr - - - ')
+    self.assertEqual(scrlog.timestamp_seconds(e['timestamp']), self.utc(2020, 1, 1, 0, 0, 0))
+
+  def test_iso(self):
+    # the same instant logged by hosts in different time zones
+    for ts in ('2020-01-01T02:30:00.123456+02:00', '2019-12-31T19:30:00-05:00',
+               '2020-01-01T00:30:00+0000', '2020-01-01T00:30:00.5Z'):
+      e = self.check(ts + ' node1 scr[100]: ')
+      self.assertEqual(scrlog.timestamp_seconds(e['timestamp']), self.utc(2020, 1, 1, 0, 30, 0))
+
+    # without an offset, the timestamp is in local time
+    e = self.check('2020-01-01T02:00:00 node1 scr[100]: ')
+    self.assertEqual(e['timestamp'], datetime(2020, 1, 1, 2, 0, 0))
+
+  def test_rfc3164(self):
+    e = self.check('Jan  1 02:00:00 node1 scr[100]: ')
+    self.assertEqual(e['timestamp'], datetime(2020, 1, 1, 2, 0, 0))
+    e = self.check('<13>Feb 10 12:34:56 node2 scr[100]: ', host='node2')
+    self.assertEqual(e['timestamp'], datetime(2020, 2, 10, 12, 34, 56))
+
+  def test_other_lines(self):
+    self.assertIsNone(scrlog.parse_syslog_line('Jan  1 02:00:00 node1 kernel: eth0 link up\n'))
+    self.assertIsNone(scrlog.parse_syslog_line('Jan  1 02:00:00 node1 app: user=user1 logged in\n'))
+
+class SyslogTest(LogTest):
+  def setUp(self):
+    LogTest.setUp(self)
+    self.syslog = os.path.join(logdir, 'syslog.log')
+    self.block = scrlog.syslog_block
+
+  def tearDown(self):
+    scrlog.syslog_block = self.block
+    LogTest.tearDown(self)
+
+  def serial(self):
+    return [e for e in (scrlog.parse_syslog_line(l, 2020) for l in read_lines('syslog.log')) if e is not None]
+
+  def gzipped(self):
+    path = os.path.join(self.tmpdir, 'syslog.log.gz')
+    with open(self.syslog, 'rb') as f:
+      data = f.read()
+    with gzip.open(path, 'wb') as f:
+      f.write(data)
+    return path
+
+  def test_blocks(self):
+    # blocks smaller than a line, and blocks that end mid-line or on a newline
+    expected = self.serial()
+    self.assertEqual(len(expected), 2 * len(self.lines))
+    for block in (1, 64, 100, 257, 4096, self.block):
+      scrlog.syslog_block = block
+      self.assertEqual(list(scrlog.iter_syslog(self.syslog, year=2020)), expected)
+      self.assertEqual(list(scrlog.iter_syslog([self.gzipped()], year=2020)), expected)
+
+  def test_procs(self):
+    expected = self.serial()
+    scrlog.syslog_block = 257
+    for path in (self.syslog, self.gzipped()):
+      self.assertEqual(list(scrlog.iter_syslog([path], year=2020, procs=3)), expected)
+
+  def test_filters(self):
+    expected = [e for e in self.serial() if e['type'] == 'xfer' and e['label'] == 'FLUSH_SYNC']
+    self.assertTrue(expected)
+    scrlog.syslog_block = 100
+    found = scrlog.iter_syslog([self.syslog], labels=['FLUSH_SYNC'], types=['xfer'], year=2020, procs=2)
+    self.assertEqual(list(found), expected)
+
+  def test_scan(self):
+    # records are grouped by prefix and jobid, each run in time order,
+    # whether read in one piece or as rotated files listed out of order
+    expected = dict()
+    for e in self.serial():
+      expected.setdefault(e['prefix'], dict()).setdefault(e['jobid'], []).append(e)
+    for runs in expected.values():
+      for entries in runs.values():
+        entries.sort(key=lambda e: e['timestamp'])
+    self.assertEqual(sorted(expected), ['/p/fs/job', '/p/fs/other'])
+    self.assertEqual(sorted(expected['/p/fs/job']), ['1001', '1002', '1003'])
+
+    lines = read_lines('syslog.log')
+    half = len(lines) // 2
+    older = os.path.join(self.tmpdir, 'messages.1')
+    newer = os.path.join(self.tmpdir, 'messages')
+    with open(older, 'w') as f:
+      f.writelines(lines[:half])
+    with open(newer, 'w') as f:
+      f.writelines(lines[half:])
+    scrlog.syslog_block = 100
+    self.assertEqual(scrlog.scan_syslog([self.syslog], year=2020), expected)
+    self.assertEqual(scrlog.scan_syslog([newer, older], year=2020, procs=2), expected)
+
+class TransferLevelTest(unittest.TestCase):
+  def test_levels(self):
+    bases = []
+    levels = [(e['label'], scrlog.transfer_level(bases, e))
+              for e in scrlog.iter_lines(read_lines('ckpt_interval.log'), types=['xfer'])]
+    self.assertEqual(bases, ['/dev/shm'])
+    for label, level in levels:
+      self.assertEqual(level, '/dev/shm' if label in scrlog.cache_types else 'prefix')
+
+  def test_cache_level(self):
+    # the longest base seen wins, and an unseen path is guessed from its first components
+    bases = ['/l/ssd', '/l/ssd/scr']
+    self.assertEqual(scrlog.cache_level(bases, '/l/ssd/scr/scr.dataset.1'), '/l/ssd/scr')
+    self.assertEqual(scrlog.cache_level(bases, '/l/ssdx/scr.dataset.1'), '/l/ssdx')
+    self.assertEqual(scrlog.cache_level([], '/dev/shm/user/scr.dataset.1'), '/dev/shm')
+
+class TimestampTest(unittest.TestCase):
+  def test_fixed_format(self):
+    for ts in ('2020-01-01T00:00:00', '2021-12-31T23:59:59', '2020-02-29T12:34:56'):
+      self.assertEqual(scrlog.parse_timestamp(ts), datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S'))
+
+  def test_cache(self):
+    # repeated timestamps come from the cache, which stays bounded
+    dt = scrlog.parse_timestamp('2020-01-01T00:00:00')
+    self.assertIs(scrlog.parse_timestamp('2020-01-01T00:00:00'), dt)
+    for i in range(scrlog.max_timestamps + 10):
+      scrlog.parse_timestamp('2020-01-01T%02d:%02d:%02d' % (i // 3600 % 24, i // 60 % 60, i % 60))
+    self.assertLessEqual(len(scrlog.timestamps), scrlog.max_timestamps)
+
+  def test_seconds(self):
+    dt = scrlog.parse_timestamp('2020-01-01T00:00:10')
+    self.assertEqual(scrlog.timestamp_seconds(dt) - scrlog.timestamp_seconds(scrlog.parse_timestamp('2020-01-01T00:00:00')), 10.0)
+
+if __name__ == '__main__':
+  unittest.main()